@@ -29,13 +29,28 @@ reload(sys)
 sys.setdefaultencoding('utf8')
 
 import os
+import copy
+import json
+import cPickle
+import time
 import spacy
 import types
 import distance
 import weakref
+import hashlib
+import uuid
+import shutil
+import sqlite3
+import tempfile
+import threading
+import multiprocessing
 import textacy
 import textacy.keyterms
+import itertools
 import collections
+import requests
+from multiprocessing.pool import ThreadPool
+import numpy as np
 import networkx as nx
 from pyzotero import zotero
 
@@ -48,6 +63,157 @@ from intertext.functions import *
 
 
 
+### Registry Class
+###############################################################################
+class Registry(object):
+	'''
+	Keeps weakrefs to all living instances of a class (``Actor``, ``Text``)
+	and indexes them by label and by identity key, so that label assignment,
+	``is_copy`` and ``_original`` only look at instances with the same key
+	instead of scanning the whole universe.
+
+	- key = function returning the identity key of an instance. Instances
+	  can only be alike if their keys are equal.
+	- fingerprint = optional function returning a frozenset that stands for
+	  the attributes of an instance. Instances are bucketed by fingerprint
+	  so that buckets whose fingerprint is no superset can be skipped.
+
+	Entries are dropped by weakref callbacks as soon as an instance dies.
+	'''
+
+	def __init__(self, key, fingerprint=None):
+		self.key = key
+		self.fingerprint = fingerprint
+		self._entries = {} # ref -> (ref, label, key, fingerprint)
+		self._labels = {} # label -> ref
+		self._free = {} # label base -> number of '*' below which all are taken
+		self._members = collections.defaultdict(collections.OrderedDict) # key -> fingerprint -> [ref]
+		self._originals = collections.defaultdict(list) # key -> [ref]
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, obj):
+		return weakref.ref(obj) in self._entries
+
+	def __iter__(self):
+		return (o for o in (r() for r in self._entries.keys()) if o is not None)
+
+	def _fingerprint(self, obj):
+		return self.fingerprint(obj) if self.fingerprint else None
+
+	def label_for(self, base):
+		'''
+		Returns the first free label of the form base, base*, base**, etc.
+		'''
+		n = self._free.get(base, 0)
+		label = base + u'*' * n
+		while label in self._labels:
+			label += u'*'
+			n += 1
+		if n:
+			self._free[base] = n
+		return label
+
+	def has_like(self, obj):
+		'''
+		Returns True if obj is like any living instance
+		'''
+		fp = self._fingerprint(obj)
+		# snapshots: weakref callbacks (_discard) may change the buckets 
+		# whenever garbage is collected, e.g. during is_like
+		for bucket_fp, refs in list(self._members.get(self.key(obj), {}).items()):
+			if fp is not None and not fp <= bucket_fp:
+				continue
+			for r in list(refs):
+				o = r()
+				if o is not None and obj.is_like(o):
+					return True
+		return False
+
+	def original(self, obj):
+		'''
+		Returns the first registered original obj is like, or obj itself
+		'''
+		for r in list(self._originals.get(self.key(obj), ())):
+			o = r()
+			if o is not None and obj.is_like(o):
+				return o
+		return obj
+
+	def add(self, obj):
+		'''
+		Registers obj (under its current label) and, if obj is not like any
+		registered original, also registers it as an original
+		'''
+		is_original = self.original(obj) is obj
+		ref = weakref.ref(obj, self._discard)
+		key, fp = self.key(obj), self._fingerprint(obj)
+		self._entries[ref] = (ref, obj.label, key, fp)
+		self._labels[obj.label] = ref
+		self._members[key].setdefault(fp, []).append(ref)
+		if is_original:
+			self._originals[key].append(ref)
+
+	def reindex(self, obj):
+		'''
+		Moves obj to its new key (e.g. after its name or title changed)
+		'''
+		ref = weakref.ref(obj) # equals the registered ref while obj is alive
+		if ref not in self._entries:
+			return
+		ref, label, old_key, old_fp = self._entries[ref]
+		key, fp = self.key(obj), self._fingerprint(obj)
+		if (key, fp) == (old_key, old_fp):
+			return
+		is_original = self._unlink(ref, old_key, old_fp)
+		self._entries[ref] = (ref, label, key, fp)
+		self._members[key].setdefault(fp, []).append(ref)
+		if is_original:
+			self._originals[key].append(ref)
+
+	def _unlink(self, ref, key, fp):
+		bucket = self._members.get(key, {})
+		refs = bucket.get(fp, [])
+		if ref in refs:
+			refs.remove(ref)
+		if not refs:
+			bucket.pop(fp, None)
+		if not bucket:
+			self._members.pop(key, None)
+		originals = self._originals.get(key, [])
+		is_original = ref in originals
+		if is_original:
+			originals.remove(ref)
+		if not originals:
+			self._originals.pop(key, None)
+		return is_original
+
+	def _discard(self, ref):
+		ref, label, key, fp = self._entries.pop(ref, (ref, None, None, None))
+		if label is None:
+			return
+		self._unlink(ref, key, fp)
+		if self._labels.get(label) is ref:
+			del self._labels[label]
+			# label and all its shorter '*' bases may be free again (a base
+			# that is free itself is dropped, so dead bases do not pile up)
+			stars = len(label) - len(label.rstrip(u'*'))
+			for i in range(stars + 1):
+				base = label[:len(label) - i]
+				if self._free.get(base, 0) > i:
+					self._free[base] = i
+				if self._free.get(base) == 0:
+					del self._free[base]
+
+	def clean(self):
+		'''
+		Drops dead weakrefs that have not been dropped by their callbacks
+		'''
+		for ref in [r for r in self._entries.keys() if r() is None]:
+			self._discard(ref)
+
+
 ### Actor Class
 ###############################################################################
 class Actor(object):
@@ -57,8 +223,7 @@ class Actor(object):
 		>>> a = intertext.Actor(name=u'Foucault, Michel')
 
 	"""
-	_universe = set()
-	_originals = set()
+	_registry = Registry(key=lambda a: a.name)
 
 	def __init__(self, **attr):
 		if u'name' in attr.iterkeys():
@@ -72,14 +237,9 @@ class Actor(object):
 		else:
 			raise ValueError(u'Provide name or lastname'.format(attr))
 		self.attr = attr # or {}
-		label = self.name
-		while label in [a().label for a in Actor._universe if a()]: # 'if a()' to exclude dead refs!
-			label += u'*'
-		self._label = label
-		self._is_copy = any(self.is_like(a()) for a in Actor._universe if a())
-
-		Actor._originals.add(weakref.ref(self._original))
-		Actor._universe.add(weakref.ref(self))
+		self._label = Actor._registry.label_for(self.name)
+		self._is_copy = Actor._registry.has_like(self)
+		Actor._registry.add(self)
 
 	def __repr__(self):
 		return self.label
@@ -109,6 +269,7 @@ class Actor(object):
 			self.firstname = splitname[1]
 		else:
 			self.firstname = u''
+		Actor._registry.reindex(self)
 
 	@property
 	def lastname(self):
@@ -139,10 +300,7 @@ class Actor(object):
 
 	@property
 	def _original(self):
-		for a in Actor._originals:
-			if a() and self.is_like(a()):
-				return a()
-		return self
+		return Actor._registry.original(self)
 	
 	@property
 	def is_copy(self):
@@ -178,12 +336,17 @@ class Text(object):
 	- think of getting rid of rawtext altogether...maybe leave rawtext_path so that if no cleantext_path exists, content can be generated from rawtext?
 
 	"""
-	_universe = set()
-	_originals = set()
+	_registry = Registry(key=lambda t: (t.title, t.year), 
+		fingerprint=lambda t: freeze(t.attr))
+	doc_cache = None # DocCache used to parse docs (if not None)
+	doc_lru = None # DocLRU bounding the parsed docs kept in memory (if not None)
+	feature_cache = None # FeatureCache backing Text features on disk (if not None)
 
 	def __init__(self, **attr):
 		if not all(k in attr.iterkeys() for k in [u'title', u'date']):
 			raise ValueError(u'Provide title and date!')
+		self._intertexts = weakref.WeakSet() # Intertexts containing the text
+		self._version = 0 # incremented whenever title, date, authors, editors, cites or doc change
 		self.title = attr.pop(u'title')
 		self.date = attr.pop(u'date')
 		self.authors = attr.pop(u'authors', [])
@@ -212,29 +375,24 @@ class Text(object):
 		
 		self.attr = attr # conainer for all other attributes
 		self._year = (None, None)
-		label = self.short
-		while label in [t().label for t in Text._universe if t()]:
-			label += u'*'
-		self._label = label
-		self._is_copy = any(self.is_like(t()) for t in Text._universe if t())
-		Text._originals.add(weakref.ref(self._original))
-		Text._universe.add(weakref.ref(self))
+		self._year_int = (None, None)
+		self._title_profile = (None, None)
+		self._label = Text._registry.label_for(self.short)
+		self._is_copy = Text._registry.has_like(self)
+		Text._registry.add(self)
 
-		# Textacy doc
+		# Textacy doc (parsed from the cleantext on first access, see doc)
 		self._doc = None
-		if self.cleantext_path:
-			self.refresh_doc(content=self.cleantext)
-			print u'-> textacy.Doc created for: {}'.format(self.label)
+		self._doc_from_cleantext = False
+		self._lang = u'en_core_web_sm'
+		self._features = {} # (method, arguments) -> value, see _feature
 
 	def __repr__(self):
 		return self.label
 
 	@property
 	def _original(self):
-		for t in Text._originals: # narrow selection?
-			if t() and self.is_like(t()):
-				return t()
-		return self
+		return Text._registry.original(self)
 
 	@property
 	def is_copy(self):
@@ -253,46 +411,74 @@ class Text(object):
 		return any(self.is_like(i) for i in others)
 
 	def compares_to(self, other, nlev=0.1, date_span=(4,4)):
-		if not isinstance(other, Text):
-			raise ValueError(u'Compare to another Text')		
-		return 1 if (
-			self.is_like(other)
-			) else 2 if (
-			self.year == other.year
-			and distance.nlevenshtein(
-				self.title, other.title, method=2) <= nlev
-			) else 3 if (
-			self.title == other.title
-			and int(self.year) + date_span[1]
-			>= int(other.year)
-			>= int(self.year) - date_span[0]
-			) else 4 if (
-			distance.nlevenshtein(
-				self.title, other.title, method=2) <= nlev
-			and int(self.year) + date_span[1]
-			>= int(other.year)
-			>= int(self.year) - date_span[0]
-			) else 99
-
-	def best_matches_in(self, population, match_hierarchy=MATCH_HIERARCHY, min_percent_titlelength=80, same_firstletter=True):
+		return self.compares_to_all([other], nlev=nlev, date_span=date_span)[0]
+
+	def compares_to_all(self, others, nlev=0.1, date_span=(4,4)):
+		'''
+		Batched version of compares_to: returns the match level for each text 
+		in others. Title distances are only computed for texts within the 
+		date span, all at once and bounded by nlev (see nlevenshtein_batch).
+		'''
+		year = self.year_int
+		levels = [99] * len(others)
+		pending = [] # (index, same_year, in_span)
+		for i, t in enumerate(others):
+			if not isinstance(t, Text):
+				raise ValueError(u'Compare to another Text')
+			if self.is_like(t):
+				levels[i] = 1
+				continue
+			same_year = year == t.year_int
+			in_span = year + date_span[1] >= t.year_int >= year - date_span[0]
+			if same_year or in_span:
+				pending.append((i, same_year, in_span))
+		close = nlevenshtein_batch(self.title, 
+			[others[i].title for i, _, _ in pending], nlev=nlev, 
+			profile=self.title_profile, 
+			profiles=[others[i].title_profile for i, _, _ in pending])
+		for (i, same_year, in_span), c in zip(pending, close):
+			levels[i] = 2 if (
+				same_year and c
+				) else 3 if (
+				in_span and self.title == others[i].title
+				) else 4 if (
+				in_span and c
+				) else 99
+		return levels
+
+	def best_matches_in(self, population, match_hierarchy=MATCH_HIERARCHY, min_percent_titlelength=80, same_firstletter=True, nlev=0.1, date_span=(4,4)):
+		'''
+		Returns the best matches of the text in population (list of Texts or 
+		MatchIndex) as tuple (matches, level) or (None, None)
+		- nlev, date_span = for a MatchIndex, these must equal the settings 
+		  the index was built with (its candidates depend on them), 
+		  otherwise a ValueError is raised
+		'''
+		if isinstance(population, MatchIndex):
+			if (nlev, tuple(date_span)) != (
+				population.nlev, tuple(population.date_span)):
+				raise ValueError(u'MatchIndex was built with nlev={} and '
+					u'date_span={}, not nlev={} and date_span={}'.format(
+					population.nlev, population.date_span, nlev, date_span))
+			return population.best_matches(self, match_hierarchy=match_hierarchy,
+				min_percent_titlelength=min_percent_titlelength, 
+				same_firstletter=same_firstletter)
 		if not isinstance(population, list) and not all(isinstance(i, Text) for i in population):
 			raise ValueError(u'Population must be list of Texts')
 		matches = collections.defaultdict(list)
 		if same_firstletter and min_percent_titlelength:
-			selection = ((self.compares_to(t), t) for t in population 
+			selection = [t for t in population 
 				if t.title[0].lower() == self.title[0].lower()
-				and min(len(t.title),len(self.title)) * 100 / max(len(t.title),len(self.title)) >= min_percent_titlelength)
+				and min(len(t.title),len(self.title)) * 100 / max(len(t.title),len(self.title)) >= min_percent_titlelength]
 		elif same_firstletter:
-			selection = ((self.compares_to(t), t) for t in population 
-				if t.title[0].lower() == self.title[0].lower())
+			selection = [t for t in population 
+				if t.title[0].lower() == self.title[0].lower()]
 		elif min_percent_titlelength:
-			selection = ((self.compares_to(t), t) for t in population 
-				if min(len(t.title),len(self.title)) * 100 / max(len(t.title),len(self.title)) >= min_percent_titlelength)
+			selection = [t for t in population 
+				if min(len(t.title),len(self.title)) * 100 / max(len(t.title),len(self.title)) >= min_percent_titlelength]
 		else:
-			selection = ((self.compares_to(t), t) for t in population)
-		# for k,v in ((self.compares_to(t), t) for t in population if t.title[0].lower() == self.title[0].lower()):
-		# 	matches[k].append(v)
-		for k,v in selection:
+			selection = list(population)
+		for k,v in zip(self.compares_to_all(selection, nlev, date_span), selection):
 			matches[k].append(v)
 		for i in match_hierarchy:
 			if matches[i]:
@@ -322,6 +508,8 @@ class Text(object):
 		if not isinstance(title, basestring):
 			raise ValueError(u'Title must be unicode or string')
 		self._title = title
+		Text._registry.reindex(self)
+		self._touch()
 
 	@property
 	def date(self):
@@ -336,6 +524,25 @@ class Text(object):
 			raise ValueError(
 				u'Ill formatting: "{}"'.format(date))
 		self._date = date
+		Text._registry.reindex(self)
+		self._touch()
+
+	@property
+	def attr(self):
+		'''
+		Dict of all other attributes (e.g. the Zotero key). The registry
+		indexes texts by a fingerprint of attr, so replace it instead of
+		changing it in place: t.attr = dict(t.attr, key=value)
+		'''
+		return self._attr
+
+	@attr.setter
+	def attr(self, attr):
+		if not isinstance(attr, dict):
+			raise ValueError(u'attr must be dict')
+		self._attr = dict(attr) # a copy, so that only the setter changes it
+		Text._registry.reindex(self)
+		self._touch()
 
 	@property
 	def year(self):
@@ -349,6 +556,23 @@ class Text(object):
 		return self._year[0]
 		# return year[0][:4] or u'0000'
 
+	@property
+	def year_int(self):
+		if self._year_int[1] == self.date:
+			return self._year_int[0]
+		self._year_int = (int(self.year), self.date)
+		return self._year_int[0]
+
+	@property
+	def title_profile(self):
+		'''
+		Character counts of the title (cached), used to bound title distances
+		'''
+		if self._title_profile[1] == self.title:
+			return self._title_profile[0]
+		self._title_profile = (char_profile(self.title), self.title)
+		return self._title_profile[0]
+
 	@property
 	def authors(self):
 		return self._authors
@@ -360,6 +584,7 @@ class Text(object):
 	@authors.setter
 	def authors(self, authors):
 		self._authors = []
+		self._touch()
 		self.add_authors(authors)
 
 	def add_authors(self, authors):
@@ -378,11 +603,12 @@ class Text(object):
 			if not authors._original in self._authors:
 				self._authors.append(authors._original)
 		elif isinstance(authors, dict):
-			candidate = Actor(**i)
+			candidate = Actor(**authors)
 			if not candidate._original in self._authors:
 				self._authors.append(candidate._original)
 		else:
 			raise ValueError(u'Authors must be list, Actor, or dict')
+		self._touch()
 
 	@property
 	def editors(self):
@@ -391,6 +617,7 @@ class Text(object):
 	@editors.setter
 	def editors(self, editors):
 		self._editors = []
+		self._touch()
 		self.add_editors(editors)
 
 	def add_editors(self, editors):
@@ -409,48 +636,72 @@ class Text(object):
 			if not editors._original in self._editors:
 				self._editors.append(editors._original)
 		elif isinstance(editors, dict):
-			candidate = Actor(**i)
+			candidate = Actor(**editors)
 			if not candidate._original in self._editors:
 				self._editors.append(candidate._original)
 		else:
 			raise ValueError(u'Editors must be list, Actor, or dict')
+		self._touch()
+
+	def _touch(self):
+		'''
+		Marks the text (and all Intertexts containing it) as changed
+		'''
+		self._version += 1
+		for it in self._intertexts:
+			it._touch()
 
 	@property
 	def cites(self):
-		return sorted(list(self._cites), key=Text.call_label, reverse=True)
+		if self._sorted_cites[1] != self._version:
+			self._sorted_cites = (sorted(list(self._cites), 
+				key=Text.call_label, reverse=True), self._version)
+		return list(self._sorted_cites[0])
 
 	@cites.setter
 	def cites(self, others):
+		for it in getattr(self, u'_intertexts', ()):
+			it._unindex_citations(self)
 		self._cites = set()
+		self._sorted_cites = (None, None)
+		self._touch()
 		self.add_citations_to(others)
 
 	def add_citations_to(self, others):
 		if isinstance(others, list):
 			for i in others:
 				if isinstance(i, Text): 
-					self._cites.add(i._original)
+					self._add_citation(i._original)
 				elif isinstance(i, dict):
 					candidate = Text(**i)
-					self._cites.add(candidate._original)
+					self._add_citation(candidate._original)
 				else:
 					raise ValueError(u'Citations in list must be Text or dict')
 		elif isinstance(others, Text):
-			self._cites.add(others._original)
+			self._add_citation(others._original)
 		elif isinstance(others, dict):
 			candidate = Text(**others)
-			self._cites.add(candidate._original)
+			self._add_citation(candidate._original)
 		else:
 			raise ValueError(u'Citations must be list, Text, or dict')
 
+	def _add_citation(self, other):
+		if other in self._cites:
+			return
+		self._cites.add(other)
+		for it in self._intertexts:
+			it._index_citation(self, other)
+		self._touch()
+
 	def cited_by(self, population):
 		if isinstance(population, Intertext):
-			population = population._texts
+			return population.cited_by(self)
 		if not (
 			isinstance(population, (list, set, tuple)) 
 			and all(isinstance(i, Text) for i in population)
 			):
 				raise ValueError(u'Poulation must be iterable and can only contain Text elements')
-		return sorted([t for t in population if self in t.cites], key=Text.call_label, reverse=True)
+		return sorted([t for t in population if self in t._cites], key=Text.call_label, reverse=True)
 
 	@property
 	def rawtext(self, read_method=u'textract'):
@@ -460,19 +711,83 @@ class Text(object):
 
 	@property
 	def doc(self):
+		'''
+		The textacy.Doc of the text. Unless set with refresh_doc, it is 
+		parsed from the cleantext on first access (see prefetch_doc).
+		'''
+		if self._doc is None and self.cleantext_path:
+			self.prefetch_doc()
+		elif self._doc_from_cleantext and Text.doc_lru is not None:
+			Text.doc_lru.touch(self)
 		return self._doc
 
-	def refresh_doc(self, content=None, metadata=None, lang=u'en_core_web_sm'):
-		if not any(isinstance(content, t) for t in [basestring, textacy.Doc]):
-			raise ValueError(u'Content must be unicode, string or textacy.Doc')
+	@property
+	def has_doc(self):
+		'''
+		True if the doc is parsed (without parsing it)
+		'''
+		return self._doc is not None
+
+	def prefetch_doc(self, lang=None, disable=()):
+		'''
+		Parses the cleantext now instead of on first access of doc (see 
+		``Intertext.build_docs`` to prefetch the docs of many texts)
+		'''
+		if self._doc is not None or not self.cleantext_path:
+			return
+		self._set_doc(self.cleantext, metadata=None, lang=lang or self._lang, 
+			disable=disable, from_cleantext=True)
+		print u'-> textacy.Doc created for: {}'.format(self.label)
+
+	def refresh_doc(self, content=None, metadata=None, lang=u'en_core_web_sm', 
+		disable=()):
+		'''
+		Sets the doc to content (parsed if unicode or string)
+		- lang = name of a spacy model or a loaded spacy Language (see 
+		  load_model)
+		- disable = pipeline components not to run, e.g. (u'parser', u'ner')
+		'''
+		if not any(isinstance(content, t) for t in [basestring, textacy.Doc, spacy.tokens.Doc]):
+			raise ValueError(u'Content must be unicode, string, textacy.Doc or spacy Doc')
+		if isinstance(content, textacy.Doc):
+			content = content.spacy_doc
 		# What if content is empty? Try and decide
 		metadata = metadata or {}
 		if not isinstance(metadata, dict):
 			raise ValueError(u'metadata must be dict')
 
+		self._set_doc(content, metadata=metadata, lang=lang, disable=disable)
+		self._touch()
+
+	def _set_doc(self, content, metadata, lang, disable=(), 
+		from_cleantext=False):
+		metadata = metadata or {}
 		metadata.update({u'text':self})
+		if isinstance(lang, basestring) or disable:
+			lang = load_model(lang, disable=disable)
+		if (Text.doc_cache is not None and isinstance(content, basestring) 
+			and isinstance(lang, spacy.language.Language)):
+			content = Text.doc_cache.parse(unicode(content), lang)
 		# print '==> metadata', metadata
 		self._doc = textacy.Doc(content, metadata=metadata, lang=lang)
+		self._lang = lang
+		if not (from_cleantext and self._doc_from_cleantext is None):
+			self._features = {}
+		self._doc_from_cleantext = from_cleantext
+		if Text.doc_lru is not None:
+			if from_cleantext:
+				Text.doc_lru.add(self)
+			else:
+				Text.doc_lru.discard(self)
+
+	def evict_doc(self):
+		'''
+		Drops the doc if it was parsed from the cleantext (it is parsed again 
+		on next access)
+		'''
+		if self._doc_from_cleantext and self.cleantext_path:
+			self._doc = None
+			self._doc_from_cleantext = None # features stay valid
 
 	# @doc.setter
 	# def doc(self, content, metadata=None, lang=u'en_core_web_sm'):
@@ -493,6 +808,26 @@ class Text(object):
 	# def refresh_doc(self):
 	# 	self.doc = self.cleantext
 
+	@property
+	def cleantext_path(self):
+		'''
+		Path of the cleantext. Setting it (also to the same path, e.g. after
+		the file was rewritten) drops a doc parsed from the former cleantext 
+		and marks the text as changed.
+		'''
+		return self._cleantext_path
+
+	@cleantext_path.setter
+	def cleantext_path(self, path):
+		self._cleantext_path = path
+		if getattr(self, u'_doc_from_cleantext', False) is not False:
+			self._doc = None
+			self._doc_from_cleantext = False
+			self._features = {}
+			if Text.doc_lru is not None:
+				Text.doc_lru.discard(self)
+		self._touch()
+
 	@property
 	def cleantext(self, read_method=u'textract'):
 		if not self.cleantext_path:
@@ -528,7 +863,7 @@ class Text(object):
 		print self.rawtext_path
 		with open(path, 'w') as f:
 			f.write(cleantext)
-		self.cleantext_path = path # Hieraus noch richtige setter machen?
+		self.cleantext_path = path
 
 	def open_rawtext(self):
 		if not self.rawtext_path:
@@ -551,58 +886,1035 @@ class Text(object):
 		words_in_context([self.doc], words=words, ignore_case=True, 
 			window_width=50, print_only=True)
 
+	def _feature(self, name, params, compute, ids=False):
+		'''
+		Returns compute(doc) for the feature name with params (dict of all 
+		arguments), memoised until the doc is replaced by refresh_doc and, 
+		if ``Text.feature_cache`` is set, on disk
+		- ids = the value holds StringStore ids (a list of ids or a dict with 
+		  ids as keys), which are stored on disk as strings and mapped back to 
+		  ids of the model's vocab when read
+		'''
+		key = (name, freeze(params))
+		if key in self._features:
+			return self._features[key]
+		cache, disk_key = Text.feature_cache, None
+		if cache is not None and (self._doc is not None or self.cleantext_path):
+			lang = load_model(self._lang) if isinstance(self._lang, basestring) else self._lang
+			if isinstance(lang, spacy.language.Language):
+				content = self._doc.text if self._doc is not None else self.cleantext
+				disk_key = cache.key(content, lang, name, params)
+				value = cache.get(disk_key)
+				if value is not None and ids:
+					value = FeatureCache.from_strings(value, lang.vocab.strings)
+				if value is not None:
+					self._features[key] = value
+					return value
+		if not self.doc:
+			return None
+		value = self._features[key] = compute(self.doc)
+		if disk_key is not None:
+			try:
+				cache.set(disk_key, FeatureCache.to_strings(
+					value, self.doc.spacy_doc.vocab.strings) if ids else value)
+			except KeyError: # id without string (e.g. lemma of a blank model)
+				pass
+		return value
+
 	def terms(self, ngrams=(1, 2, 3), named_entities=True, normalize=u'lemma',
 		lemmatize=None, lowercase=None, as_strings=False, **kwargs):
-		if self.doc:
-			return self.doc.to_terms_list(ngrams=ngrams, 
-				named_entities=named_entities, normalize=normalize, 
-				lemmatize=lemmatize, lowercase=lowercase, 
-				as_strings=as_strings, **kwargs)
+		params = dict(kwargs, ngrams=ngrams, named_entities=named_entities, 
+			normalize=normalize, lemmatize=lemmatize, lowercase=lowercase, 
+			as_strings=as_strings)
+		terms = self._feature(u'terms', params, 
+			lambda doc: list(doc.to_terms_list(**params)), ids=not as_strings)
+		if terms is not None:
+			return iter(terms)
 
 	def keywords(self, normalize=u'lemma', window_width=2, 
 		edge_weighting=u'binary', ranking_algo=u'pagerank', 
 		join_key_words=False, n_keyterms=10, **kwargs):
-		if self.doc:
-			return textacy.keyterms.key_terms_from_semantic_network(self.doc,
-				normalize=normalize, window_width=window_width, 
-				edge_weighting=edge_weighting, ranking_algo=ranking_algo, 
-				join_key_words=join_key_words, 
-				n_keyterms=n_keyterms, **kwargs)
+		params = dict(kwargs, normalize=normalize, window_width=window_width, 
+			edge_weighting=edge_weighting, ranking_algo=ranking_algo, 
+			join_key_words=join_key_words, n_keyterms=n_keyterms)
+		keywords = self._feature(u'keywords', params, 
+			lambda doc: textacy.keyterms.key_terms_from_semantic_network(doc, 
+				**params))
+		if keywords is not None:
+			return list(keywords)
 
 	def semantic_network(self, nodes=u'words', normalize=u'lemma', 
 		edge_weighting=u'default', window_width=10):
-		if self.doc:
-			return self.doc.to_semantic_network(nodes=nodes, 
-				normalize=normalize, edge_weighting=edge_weighting, 
-				window_width=window_width)
+		params = dict(nodes=nodes, normalize=normalize, 
+			edge_weighting=edge_weighting, window_width=window_width)
+		network = self._feature(u'semantic_network', params, 
+			lambda doc: doc.to_semantic_network(**params))
+		if network is not None:
+			return network.copy()
 
 	def bag_of_words(self, normalize=u'lemma', lemmatize=None, lowercase=None, 
 		weighting=u'count', as_strings=False):
-		if self.doc:
-			return self.doc.to_bag_of_words(normalize=normalize, 
-				lemmatize=lemmatize, lowercase=lowercase, weighting=weighting, 
-				as_strings=as_strings)
+		params = dict(normalize=normalize, lemmatize=lemmatize, 
+			lowercase=lowercase, weighting=weighting, as_strings=as_strings)
+		bag = self._feature(u'bag_of_words', params, 
+			lambda doc: doc.to_bag_of_words(**params), ids=not as_strings)
+		if bag is not None:
+			return dict(bag)
 
 	def bag_of_term(self, normalize=u'lemma', lemmatize=None, lowercase=None, 
 		weighting=u'count', as_strings=False):
-		if self.doc:
-			return self.doc.to_bag_of_words(normalize=normalize, 
-				lemmatize=lemmatize, lowercase=lowercase, weighting=weighting, 
-				as_strings=as_strings)
+		return self.bag_of_words(normalize=normalize, lemmatize=lemmatize, 
+			lowercase=lowercase, weighting=weighting, as_strings=as_strings)
 
 	def bag_of_terms(self, ngrams=(1, 2, 3), named_entities=True, 
 		normalize=u'lemma', lemmatize=None, lowercase=None, weighting=u'count', 
 		as_strings=False, **kwargs):
-		if self.doc:
-			return self.doc.to_bag_of_terms(ngrams=ngrams,
-				named_entities=named_entities, normalize=normalize, 
-				lemmatize=lemmatize, lowercase=lowercase, weighting=weighting, 
-				as_strings=as_strings, **kwargs)
+		params = dict(kwargs, ngrams=ngrams, named_entities=named_entities, 
+			normalize=normalize, lemmatize=lemmatize, lowercase=lowercase, 
+			weighting=weighting, as_strings=as_strings)
+		bag = self._feature(u'bag_of_terms', params, 
+			lambda doc: doc.to_bag_of_terms(**params), ids=not as_strings)
+		if bag is not None:
+			return dict(bag)
 
 	
 
 
 
+### MatchIndex Class
+###############################################################################
+class MatchIndex(object):
+	'''
+	Candidate-blocking index over a population of texts (e.g. an 
+	``Intertext``) for ``Text.best_matches_in``::
+
+		>>> index = intertext.MatchIndex(it)
+		>>> matches, level = citation.best_matches_in(index)
+
+	Texts are indexed by exact title (for match levels 1 and 3) and by title 
+	q-grams in year buckets (for match levels 2 and 4). A text is only 
+	scored with ``compares_to`` if it shares the title or enough q-grams 
+	(count filter) within the year window of ``date_span``. The filter is 
+	lossless: results equal those of ``best_matches_in`` over the full 
+	population, provided nlev and date_span are the same (passing others to
+	``best_matches_in`` with the index raises a ValueError).
+
+	Texts must not change title or date after they have been added.
+	'''
+
+	def __init__(self, texts=None, nlev=0.1, date_span=(4,4), q=3):
+		if isinstance(texts, Intertext):
+			texts = texts._texts
+		self.nlev = nlev
+		self.date_span = date_span
+		self.q = q
+		self._texts = set()
+		self._by_title = collections.defaultdict(list) # title -> [text]
+		self._by_gram = collections.defaultdict(dict) # (year, gram) -> {text: count}
+		self._by_length = collections.defaultdict(
+			lambda: collections.defaultdict(list)) # year -> length -> [text]
+		if texts:
+			self.add_texts(texts)
+
+	def __len__(self):
+		return len(self._texts)
+
+	def __contains__(self, text):
+		return text in self._texts
+
+	@property
+	def texts(self):
+		return sorted(list(self._texts), key=Text.call_label)
+
+	def add_texts(self, texts):
+		if isinstance(texts, Text):
+			texts = [texts]
+		for t in texts:
+			if not isinstance(t, Text):
+				raise ValueError(u'Can only index Texts')
+			if t in self._texts:
+				continue
+			self._texts.add(t)
+			year = int(t.year)
+			self._by_title[t.title].append(t)
+			for gram, count in qgrams(t.title, self.q).iteritems():
+				self._by_gram[(year, gram)][t] = count
+			self._by_length[year][len(t.title)].append(t)
+
+	def _max_edits(self, len1, len2):
+		'''
+		Upper bound of the edit distance of two titles whose normalized 
+		distance (method 2) is at most nlev. The longest alignment is at most
+		min(len1, len2) + edits long, hence edits <= nlev * min / (1 - nlev).
+		'''
+		if self.nlev >= 1:
+			return max(len1, len2)
+		return int(self.nlev * min(len1, len2) / (1 - self.nlev) + 1e-9)
+
+	def _min_overlap(self, len1, len2):
+		'''
+		Number of shared q-grams needed for two titles to be within nlev 
+		(None if their lengths alone rule this out)
+		'''
+		edits = self._max_edits(len1, len2)
+		if abs(len1 - len2) > edits:
+			return None
+		return max(len1, len2) - self.q + 1 - edits * self.q
+
+	def candidates(self, text):
+		'''
+		Returns all indexed texts that can match text at levels 1 to 4
+		'''
+		title, year = text.title, int(text.year)
+		found = set(self._by_title.get(title, ()))
+		grams = qgrams(title, self.q)
+		for y in range(year - self.date_span[0], year + self.date_span[1] + 1):
+			overlap = collections.Counter()
+			for gram, count in grams.iteritems():
+				for t, c in self._by_gram.get((y, gram), {}).iteritems():
+					overlap[t] += min(count, c)
+			for t, n in overlap.iteritems():
+				needed = self._min_overlap(len(title), len(t.title))
+				if needed is not None and n >= needed:
+					found.add(t)
+			for length, texts in self._by_length.get(y, {}).iteritems():
+				needed = self._min_overlap(len(title), length)
+				if needed is not None and needed <= 0:
+					found.update(texts)
+		return found
+
+	def best_matches(self, text, match_hierarchy=MATCH_HIERARCHY, 
+		min_percent_titlelength=80, same_firstletter=True):
+		'''
+		Same as ``text.best_matches_in(population)`` for the indexed population
+		'''
+		candidates = sorted(list(self.candidates(text)), key=Text.call_label)
+		return text.best_matches_in(candidates, match_hierarchy=match_hierarchy,
+			min_percent_titlelength=min_percent_titlelength, 
+			same_firstletter=same_firstletter, nlev=self.nlev, 
+			date_span=self.date_span)
+
+
+### MatchCache Class
+###############################################################################
+class MatchCache(object):
+	'''
+	On-disk cache of citation matches (e.g. across ``load_Zotero`` runs)::
+
+		>>> cache = intertext.MatchCache(u'matches.json')
+		>>> cache.validate(it) # drops the entries the changes may affect
+		>>> cache.get(citation, **params) # -> (reference, level) or None
+		>>> cache.set(citation, match, level, candidates, text, **params)
+		>>> cache.save()
+
+	Citations (dicts as returned by ``parse_citlist``) are keyed by their 
+	normalised title, date and authors plus the matching parameters. A match
+	is stored as a reference (title, date, Zotero key) to a text of the 
+	population, or as None if the citation matched nothing, together with 
+	the references of its ``MatchIndex`` candidates. When the population 
+	changes, validate drops the entries without match and those whose 
+	candidates include removed or changed texts or would include added ones.
+	All other entries are kept.
+	'''
+
+	_Probe = collections.namedtuple('Probe', 'title year') # for candidates
+
+	def __init__(self, path):
+		self.path = path
+		self._population = None # references of the texts matched against
+		self._entries = {}
+		self._changed = False
+		if os.path.isfile(path):
+			with open(path) as f:
+				data = json.load(f)
+			if u'population' in data: # older files held only a signature
+				self._population = set(data[u'population'])
+				self._entries = data.get(u'entries', {})
+
+	def __len__(self):
+		return len(self._entries)
+
+	@staticmethod
+	def reference(text):
+		return [text.title, text.date, text.attr.get(u'key')]
+
+	def validate(self, population):
+		'''
+		Drops the entries that may change in population (see class docstring)
+		'''
+		if isinstance(population, Intertext):
+			population = population._texts
+		refs = dict((json.dumps(MatchCache.reference(t)), t) for t in population)
+		if self._population is None:
+			self._entries = {}
+		elif self._population.symmetric_difference(refs):
+			removed = self._population.difference(refs)
+			added = [t for r, t in refs.iteritems() if r not in self._population]
+			indexes = {} # (nlev, date_span) -> MatchIndex of the added texts
+			def affected(entry):
+				if entry[u'match'] is None or entry[u'candidates'] is None:
+					return True
+				if removed.intersection(entry[u'candidates']):
+					return True
+				if not added:
+					return False
+				params = (entry[u'nlev'], tuple(entry[u'date_span']))
+				if params not in indexes:
+					indexes[params] = MatchIndex(added, nlev=params[0], 
+						date_span=params[1])
+				return bool(indexes[params].candidates(
+					MatchCache._Probe(entry[u'title'], entry[u'year'])))
+			n = len(self._entries)
+			self._entries = dict((k, e) for k, e in self._entries.iteritems() 
+				if not affected(e))
+			print u'\t...population changed, dropped {} of {} cached matches'.\
+				format(n - len(self._entries), n)
+		else:
+			return
+		self._population = set(refs)
+		self._changed = True
+
+	@staticmethod
+	def key(citation, **params):
+		authors = [[a.get(u'lastname', u''), a.get(u'firstname', u'')] 
+			for a in citation.get(u'authors', [])]
+		params = sorted((k, list(v) if isinstance(v, tuple) else v) 
+			for k, v in params.iteritems())
+		key = json.dumps([clean_string(citation[u'title']), 
+			citation[u'date'].strip(), authors, params])
+		return hashlib.sha1(key).hexdigest()
+
+	def get(self, citation, **params):
+		entry = self._entries.get(MatchCache.key(citation, **params))
+		if entry is not None:
+			return [entry[u'match'], entry[u'level']]
+
+	def set(self, citation, match, level, candidates=None, text=None, 
+		**params):
+		'''
+		Stores the match of citation
+		- candidates = texts considered for the match (see 
+		  ``MatchIndex.candidates``), None if unknown
+		- text = Text of citation (for its title and year)
+		'''
+		reference = MatchCache.reference(match) if match is not None else None
+		self._entries[MatchCache.key(citation, **params)] = {
+			u'match': reference, 
+			u'level': level,
+			u'candidates': None if candidates is None else [
+				json.dumps(MatchCache.reference(t)) for t in candidates],
+			u'title': text.title if text is not None else citation[u'title'],
+			u'year': text.year if text is not None else citation[u'date'],
+			u'nlev': params.get(u'nlev', 0.1),
+			u'date_span': list(params.get(u'date_span', (4, 4))),
+			}
+		self._changed = True
+
+	def save(self):
+		if not self._changed:
+			return
+		tmp = self.path + u'.tmp'
+		with open(tmp, u'w') as f:
+			json.dump({u'population': sorted(self._population or ()), 
+				u'entries': self._entries}, f)
+		os.rename(tmp, self.path)
+		self._changed = False
+
+
+### DocCache Class
+###############################################################################
+class DocCache(object):
+	'''
+	Content-addressed on-disk cache of parsed docs::
+
+		>>> intertext.Text.doc_cache = intertext.DocCache(u'docs', max_bytes=2**30)
+
+	Once set as ``Text.doc_cache``, docs parsed by ``Text.refresh_doc``,  
+	``Text.doc`` and ``Intertext.build_docs`` are loaded from the cache if 
+	possible and stored in it otherwise. Entries are keyed by a hash of the 
+	content, the name, version and language of the spacy model, the spacy 
+	version and the pipeline components, and stored as one file each (see 
+	doc_to_bytes). If the files exceed max_bytes in total, the least 
+	recently used ones are deleted.
+	'''
+
+	def __init__(self, path, max_bytes=2**30):
+		self.path = path
+		self.max_bytes = max_bytes
+		if not os.path.isdir(path):
+			os.makedirs(path)
+		self._entries = {} # key -> [size, last use]
+		for name in os.listdir(path):
+			if name.endswith(u'.bin'):
+				stat = os.stat(os.path.join(path, name))
+				self._entries[name[:-4]] = [stat.st_size, stat.st_mtime]
+		self.size = sum(size for size, _ in self._entries.itervalues())
+
+	def __len__(self):
+		return len(self._entries)
+
+	@staticmethod
+	def key(content, nlp):
+		model = json.dumps([nlp.meta.get(u'lang'), nlp.meta.get(u'name'), 
+			nlp.meta.get(u'version'), spacy.about.__version__, nlp.pipe_names])
+		return hashlib.sha1(model + b'\n' + content.encode(u'utf-8')).hexdigest()
+
+	def _file(self, key):
+		return os.path.join(self.path, key + u'.bin')
+
+	def get(self, key, vocab):
+		'''
+		Returns the cached spacy Doc on vocab or None
+		'''
+		if key not in self._entries:
+			return None
+		try:
+			with open(self._file(key), u'rb') as f:
+				doc = doc_from_bytes(vocab, f.read())
+		except (IOError, OSError, ValueError, KeyError):
+			self._drop(key)
+			return None
+		self._entries[key][1] = time.time()
+		os.utime(self._file(key), None)
+		return doc
+
+	def set(self, key, doc):
+		data = doc_to_bytes(doc)
+		tmp = self._file(key) + u'.tmp'
+		with open(tmp, u'wb') as f:
+			f.write(data)
+		os.rename(tmp, self._file(key))
+		if key in self._entries:
+			self.size -= self._entries[key][0]
+		self._entries[key] = [len(data), time.time()]
+		self.size += len(data)
+		self.evict()
+
+	def _drop(self, key):
+		size, _ = self._entries.pop(key)
+		self.size -= size
+		try:
+			os.remove(self._file(key))
+		except OSError:
+			pass
+
+	def evict(self):
+		'''
+		Deletes the least recently used entries until size <= max_bytes
+		'''
+		if self.size <= self.max_bytes:
+			return
+		for key, _ in sorted(self._entries.iteritems(), key=lambda i: i[1][1]):
+			self._drop(key)
+			if self.size <= self.max_bytes:
+				break
+
+	def parse(self, content, nlp):
+		return next(self.parse_all([content], nlp))
+
+	def parse_all(self, contents, nlp, batch_size=50, n_process=1, **kwargs):
+		'''
+		Yields a spacy Doc for each of contents (unicode), in order. Contents 
+		not in the cache are parsed with parse_docs(..., **kwargs) and cached.
+		Contents are read and cached docs loaded one at a time; only the 
+		contents waiting for the next batch of misses (batch_size per 
+		process) are held in memory.
+		'''
+		if n_process is not None and n_process < 0:
+			n_process = multiprocessing.cpu_count()
+		window = batch_size * max(1, n_process or 1)
+		pending, misses = [], 0 # (key, content, hit) in order
+		for content in contents:
+			key = DocCache.key(content, nlp)
+			hit = key in self._entries
+			pending.append((key, content, hit))
+			misses += not hit
+			# hits are yielded right away unless misses before them wait
+			if len(pending) >= window or not misses:
+				for doc in self._parse_pending(pending, nlp, batch_size=batch_size,
+					n_process=n_process, **kwargs):
+					yield doc
+				pending, misses = [], 0
+		for doc in self._parse_pending(pending, nlp, batch_size=batch_size,
+			n_process=n_process, **kwargs):
+			yield doc
+
+	def _parse_pending(self, pending, nlp, **kwargs):
+		parsed = parse_docs([content for _, content, hit in pending if not hit], 
+			nlp, **kwargs) if not all(hit for _, _, hit in pending) else None
+		for key, content, hit in pending:
+			doc = self.get(key, nlp.vocab) if hit else next(parsed)
+			if doc is None: # unreadable cache file (dropped by get)
+				doc = nlp(content)
+			if key not in self._entries:
+				self.set(key, doc)
+			yield doc
+
+
+### DocLRU Class
+###############################################################################
+class DocLRU(object):
+	'''
+	Bound on the parsed docs kept in memory::
+
+		>>> intertext.Text.doc_lru = intertext.DocLRU(max_docs=100)
+
+	Once set as ``Text.doc_lru``, docs parsed from cleantexts (on access of 
+	``Text.doc``, with ``Text.prefetch_doc`` or ``Intertext.build_docs``) 
+	are tracked here. Whenever there are more than max_docs of them or their 
+	estimated size (see doc_nbytes) exceeds max_bytes, the least recently 
+	used are dropped from their texts. Dropped docs are parsed again (or 
+	loaded from ``Text.doc_cache``) on next access. Docs set with 
+	``Text.refresh_doc`` are never dropped.
+	'''
+
+	def __init__(self, max_docs=None, max_bytes=None):
+		self.max_docs = max_docs
+		self.max_bytes = max_bytes
+		self._entries = collections.OrderedDict() # id(text) -> (weakref, nbytes)
+		self.size = 0
+
+	def __len__(self):
+		return len(self._entries)
+
+	def add(self, text):
+		self.discard(text)
+		nbytes = doc_nbytes(text._doc.spacy_doc)
+		self._entries[id(text)] = (weakref.ref(text), nbytes)
+		self.size += nbytes
+		self.evict(keep=text)
+
+	def touch(self, text):
+		entry = self._entries.pop(id(text), None)
+		if entry is not None:
+			self._entries[id(text)] = entry
+
+	def discard(self, text):
+		entry = self._entries.pop(id(text), None)
+		if entry is not None:
+			self.size -= entry[1]
+
+	def _over(self):
+		return ((self.max_docs is not None and len(self._entries) > self.max_docs)
+			or (self.max_bytes is not None and self.size > self.max_bytes))
+
+	def evict(self, keep=None):
+		'''
+		Drops the least recently used docs (except the one of keep) until 
+		the bounds are met
+		'''
+		while self._entries and self._over():
+			key, (ref, nbytes) = self._entries.popitem(last=False)
+			text = ref()
+			if text is keep and text is not None:
+				self._entries[key] = (ref, nbytes)
+				if len(self._entries) == 1:
+					break
+				continue
+			self.size -= nbytes
+			if text is not None:
+				text.evict_doc()
+
+
+### FeatureCache Class
+###############################################################################
+class FeatureCache(object):
+	'''
+	On-disk cache of Text features (terms, keywords, bag_of_words, etc.)::
+
+		>>> intertext.Text.feature_cache = intertext.FeatureCache(u'features')
+
+	Entries are keyed by a hash of the content and model of the doc (see 
+	``DocCache.key``), the method and its arguments, and pickled to one file 
+	each. StringStore ids (e.g. of terms(as_strings=False)) are only valid 
+	within a vocab, so such values are stored as strings (see to_strings).
+	'''
+
+	def __init__(self, path):
+		self.path = path
+		if not os.path.isdir(path):
+			os.makedirs(path)
+
+	@staticmethod
+	def key(content, nlp, name, params):
+		return hashlib.sha1(DocCache.key(content, nlp) + json.dumps(
+			[name, params], sort_keys=True, default=repr)).hexdigest()
+
+	def _file(self, key):
+		return os.path.join(self.path, key + u'.pkl')
+
+	def get(self, key):
+		'''
+		Returns the cached value or None
+		'''
+		try:
+			with open(self._file(key), u'rb') as f:
+				return cPickle.load(f)
+		except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+			return None
+
+	@staticmethod
+	def to_strings(value, strings):
+		'''
+		Replaces the StringStore ids in value (list of ids or dict keyed by 
+		ids) by their strings
+		'''
+		if isinstance(value, dict):
+			return dict((strings[k], v) for k, v in value.iteritems())
+		return [strings[i] for i in value]
+
+	@staticmethod
+	def from_strings(value, strings):
+		'''
+		Inverse of to_strings, adding the strings to the StringStore strings. 
+		Returns None for values not stored as strings.
+		'''
+		if not all(isinstance(i, basestring) for i in value):
+			return None
+		if isinstance(value, dict):
+			return dict((strings.add(k), v) for k, v in value.iteritems())
+		return [strings.add(i) for i in value]
+
+	def set(self, key, value):
+		tmp = self._file(key) + u'.tmp'
+		with open(tmp, u'wb') as f:
+			cPickle.dump(value, f, cPickle.HIGHEST_PROTOCOL)
+		os.rename(tmp, self._file(key))
+
+
+### CoWords Class
+###############################################################################
+class CoWords(object):
+	'''
+	Counts co-words (see ``Intertext.co_words``) on an integer vocabulary. 
+	The window pairs of a document are generated with numpy and counted per 
+	document on local ids (see doc_pair_counts), which are then mapped to 
+	the corpus-wide vocabulary. Counts are accumulated in a dict keyed by 
+	pair (see pair_keys). Per-document counts can come from worker 
+	processes (see co_words_counts)::
+
+		>>> cw = intertext.CoWords(width=4)
+		>>> cw.add(u'label', [u'emission', u'trading', u'scheme', u'carbon'])
+		>>> list(cw.edges(min_freq=1))
+
+	- within_doc = if True: counts each co-occurrence within a document, if 
+	  False: max 1 co-occurrence per document
+	- connectors = if True, keeps a {label: count} dict per pair
+	'''
+
+	def __init__(self, width=4, directed=False, within_doc=False, 
+		connectors=True):
+		self.width = width
+		self.directed = directed
+		self.within_doc = within_doc
+		self.connectors = connectors
+		self.vocab = {} # term -> id
+		self.terms = [] # id -> term
+		self.freq = collections.defaultdict(int) # pair key -> freq
+		self._connectors = collections.defaultdict(dict) # pair key -> {label: count}
+
+	def __len__(self):
+		return len(self.freq)
+
+	def ids(self, terms):
+		ids = []
+		for t in terms:
+			i = self.vocab.get(t)
+			if i is None:
+				i = self.vocab[t] = len(self.terms)
+				self.terms.append(t)
+			ids.append(i)
+		return ids
+
+	def add(self, label, terms):
+		self.add_doc_counts(label, *doc_pair_counts(terms, width=self.width, 
+			directed=self.directed))
+
+	def add_doc_counts(self, label, terms, keys, counts):
+		'''
+		Adds the counts of a document as returned by doc_pair_counts
+		'''
+		if not len(keys):
+			return
+		ids = np.array(self.ids(terms), dtype=np.int64)
+		keys = np.asarray(keys, dtype=np.int64)
+		first, other = ids[keys >> 32], ids[keys & 0xffffffff]
+		if not self.directed:
+			first, other = np.minimum(first, other), np.maximum(first, other)
+		self.add_counts(label, ((first << 32) | other).tolist(), 
+			np.asarray(counts).tolist())
+
+	def add_counts(self, label, keys, counts):
+		for k, c in itertools.izip(keys, counts):
+			c = c if self.within_doc else 1
+			self.freq[k] += c
+			if self.connectors:
+				self._connectors[k][label] = c
+
+	def edges(self, min_freq=1, connectors=False):
+		'''
+		Yields (term, term, {'freq':...}) for all pairs with freq >= min_freq
+		(with 'connectors' if connectors=True)
+		'''
+		for k, f in self.freq.iteritems():
+			if f < min_freq:
+				continue
+			i, j = split_pair_key(k)
+			data = {u'freq': f}
+			if connectors:
+				data[u'connectors'] = dict(self._connectors[k])
+			yield (self.terms[i], self.terms[j], data)
+
+	def graph(self, min_freq=1):
+		'''
+		Returns a networkx (Di)Graph of all pairs with freq >= min_freq (terms 
+		of weaker pairs are kept as nodes)
+		'''
+		G = nx.DiGraph() if self.directed else nx.Graph()
+		for k in self.freq.iterkeys():
+			G.add_nodes_from(self.terms[i] for i in split_pair_key(k))
+		G.add_edges_from(self.edges(min_freq=min_freq, 
+			connectors=self.connectors))
+		return G
+
+	def write(self, path, min_freq=1, connectors=False):
+		'''
+		Writes all pairs with freq >= min_freq to an edge list file with one 
+		tab-separated line per pair: term, term, freq (and connectors as json)
+		'''
+		with open(path, u'w') as f:
+			for u, v, data in self.edges(min_freq=min_freq, connectors=connectors):
+				line = [u, v, unicode(data[u'freq'])]
+				if connectors:
+					line.append(json.dumps(data[u'connectors']))
+				f.write((u'\t'.join(line) + u'\n').encode(u'utf-8'))
+		return path
+
+	def close(self):
+		pass
+
+
+### SpilledCoWords Class
+###############################################################################
+class SpilledCoWords(CoWords):
+	'''
+	Out-of-core ``CoWords`` for corpora whose pairs do not fit into memory. 
+	Per-document pair counts are partitioned by a hash of the pair into 
+	n_shards files in a temporary directory (inside path). On output, each 
+	shard is read, sorted by pair and merged, and min_freq is applied, so 
+	only one shard is held in memory at a time. Only the vocabulary and the
+	document labels are kept in memory.
+
+	Call close() (or exhaust the output generators of ``Intertext.co_words``)
+	to delete the shard files.
+	'''
+	record = np.dtype([(u'key', u'<i8'), (u'doc', u'<i4'), (u'count', u'<i4')])
+
+	def __init__(self, path=None, n_shards=64, buffer_size=1000000, **kwargs):
+		CoWords.__init__(self, **kwargs)
+		self.path = tempfile.mkdtemp(prefix=u'co_words_', dir=path)
+		self.n_shards = n_shards
+		self.buffer_size = buffer_size
+		self.labels = [] # doc id -> label
+		self._buffers = [[] for _ in range(n_shards)]
+		self._buffered = 0
+		self._added = 0 # number of add_counts calls
+		self._size = None # number of pairs, counted on complete merges
+
+	def __len__(self):
+		'''
+		Number of pairs. Counted whenever all shards have been merged (e.g. 
+		by edges or graph) and kept until counts are added; otherwise, the 
+		shards are merged once to count them.
+		'''
+		if self._size is None:
+			for _ in self._merged(min_freq=np.inf): # only counts
+				pass
+		return self._size
+
+	def _shard_path(self, shard):
+		return os.path.join(self.path, u'{}.bin'.format(shard))
+
+	def add_counts(self, label, keys, counts):
+		keys = np.asarray(keys, dtype=np.int64)
+		records = np.empty(len(keys), dtype=self.record)
+		records[u'key'] = keys
+		records[u'doc'] = len(self.labels)
+		records[u'count'] = counts
+		self.labels.append(label)
+		self._added += 1
+		self._size = None
+		shards = (keys.astype(np.uint64) * np.uint64(11400714819323198485)
+			>> np.uint64(32)) % np.uint64(self.n_shards)
+		order = np.argsort(shards, kind=u'mergesort')
+		records, shards = records[order], shards[order]
+		bounds = np.searchsorted(shards, np.arange(self.n_shards + 1, dtype=np.uint64))
+		for shard in range(self.n_shards):
+			if bounds[shard] < bounds[shard+1]:
+				self._buffers[shard].append(records[bounds[shard]:bounds[shard+1]])
+		self._buffered += len(records)
+		if self._buffered >= self.buffer_size:
+			self.flush()
+
+	def flush(self):
+		for shard, parts in enumerate(self._buffers):
+			if parts:
+				with open(self._shard_path(shard), u'ab') as f:
+					np.concatenate(parts).tofile(f)
+		self._buffers = [[] for _ in range(self.n_shards)]
+		self._buffered = 0
+
+	def _merged(self, min_freq=1):
+		'''
+		Yields (key, freq, records) for all pairs with freq >= min_freq, 
+		shard by shard. Once all shards are merged, the pairs are counted.
+		'''
+		self.flush()
+		added, size = self._added, 0
+		for shard in range(self.n_shards):
+			if not os.path.isfile(self._shard_path(shard)):
+				continue
+			records = np.fromfile(self._shard_path(shard), dtype=self.record)
+			records = records[np.lexsort((records[u'doc'], records[u'key']))]
+			keys, starts = np.unique(records[u'key'], return_index=True)
+			size += len(keys)
+			ends = np.append(starts[1:], len(records))
+			if self.within_doc:
+				freqs = np.add.reduceat(records[u'count'].astype(np.int64), starts)
+			else:
+				freqs = ends - starts
+			for i in np.flatnonzero(freqs >= min_freq):
+				yield int(keys[i]), int(freqs[i]), records[starts[i]:ends[i]]
+		if added == self._added: # nothing added while merging
+			self._size = size
+
+	def edges(self, min_freq=1, connectors=False):
+		for k, f, records in self._merged(min_freq=min_freq):
+			i, j = split_pair_key(k)
+			data = {u'freq': f}
+			if connectors:
+				data[u'connectors'] = dict(
+					(self.labels[d], c if self.within_doc else 1) 
+					for d, c in records[[u'doc', u'count']].tolist())
+			yield (self.terms[i], self.terms[j], data)
+
+	def graph(self, min_freq=1):
+		G = nx.DiGraph() if self.directed else nx.Graph()
+		for k, f, records in self._merged():
+			G.add_nodes_from(self.terms[i] for i in split_pair_key(k))
+		G.add_edges_from(self.edges(min_freq=min_freq, 
+			connectors=self.connectors))
+		return G
+
+	def close(self):
+		shutil.rmtree(self.path, ignore_errors=True)
+
+
+### ApproxCoWords Class
+###############################################################################
+class ApproxCoWords(CoWords):
+	'''
+	Approximate ``CoWords`` with a fixed budget of max_pairs counters 
+	(Misra-Gries heavy hitters, pruned in batches). As soon as more than 
+	2 * max_pairs pairs are counted, the (max_pairs+1)-th largest count is 
+	subtracted from all counters and the counters that drop to zero or below 
+	are discarded.
+
+	Error bounds, with N = total weight counted (see total):
+	- freq never overestimates: true freq - error <= freq <= true freq
+	- error <= N / (max_pairs + 1)
+	- every pair with true freq >= min_freq + error is reported by edges(), 
+	  and every reported pair has true freq >= min_freq
+
+	Memory for the counters is capped at 2 * max_pairs; only the 
+	vocabulary grows with the corpus. Connectors are not kept.
+	'''
+
+	def __init__(self, max_pairs=100000, **kwargs):
+		kwargs[u'connectors'] = False
+		CoWords.__init__(self, **kwargs)
+		self.max_pairs = max_pairs
+		self.total = 0 # total weight counted
+		self.error = 0 # max underestimation of any freq
+
+	def add_counts(self, label, keys, counts):
+		# pruned as soon as the budget is exceeded, also within a document
+		limit, freq = 2 * self.max_pairs, self.freq
+		for k, c in itertools.izip(keys, counts):
+			c = c if self.within_doc else 1
+			freq[k] += c
+			self.total += c
+			if len(freq) > limit:
+				self.prune()
+				freq = self.freq
+
+	def prune(self):
+		keys = np.fromiter(self.freq.iterkeys(), dtype=np.int64, 
+			count=len(self.freq))
+		freqs = np.fromiter(self.freq.itervalues(), dtype=np.int64, 
+			count=len(self.freq))
+		m = np.partition(freqs, len(freqs) - self.max_pairs - 1)[
+			len(freqs) - self.max_pairs - 1]
+		freqs -= m
+		keep = freqs > 0
+		self.freq = collections.defaultdict(int, 
+			itertools.izip(keys[keep].tolist(), freqs[keep].tolist()))
+		self.error += int(m)
+
+	def edges(self, min_freq=1, connectors=False):
+		'''
+		Yields (term, term, {'freq':..., 'error':...}) for all pairs whose 
+		(lower bound) freq is >= min_freq
+		'''
+		for u, v, data in CoWords.edges(self, min_freq=min_freq):
+			data[u'error'] = self.error
+			yield (u, v, data)
+
+
+### IncrementalCoWords Class
+###############################################################################
+class IncrementalCoWords(CoWords):
+	'''
+	``CoWords`` that keeps the pair counts of each document by label, so 
+	that documents can be added, replaced and removed without recounting 
+	the others (see sync and ``Intertext.co_words(incremental=True)``). 
+	The state can be saved to and loaded from a .npz file.
+	- lemma, filters = arguments of co_words_counts the docs are counted 
+	  with (filters are the word filters, e.g. filter_stops)
+	'''
+
+	def __init__(self, lemma=True, filters=None, **kwargs):
+		kwargs[u'connectors'] = True
+		CoWords.__init__(self, **kwargs)
+		self.lemma = lemma
+		self.filters = dict(filters or {})
+		self.docs = {} # label -> (keys, counts)
+		self.sources = {} # label -> (weakref to text, text version, digest of doc)
+		self.version = None # version of the intertext last synced
+
+	def add_counts(self, label, keys, counts):
+		self.remove(label)
+		keys = np.asarray(keys, dtype=np.int64)
+		counts = np.asarray(counts, dtype=np.int32)
+		self.docs[label] = (keys, counts)
+		CoWords.add_counts(self, label, keys.tolist(), counts.tolist())
+
+	def remove(self, label):
+		'''
+		Subtracts the counts of the document with label
+		'''
+		self.sources.pop(label, None)
+		if label not in self.docs:
+			return
+		keys, counts = self.docs.pop(label)
+		for k, c in itertools.izip(keys.tolist(), counts.tolist()):
+			self.freq[k] -= c if self.within_doc else 1
+			if self.freq[k] <= 0:
+				del self.freq[k]
+			connectors = self._connectors[k]
+			connectors.pop(label, None)
+			if not connectors:
+				del self._connectors[k]
+
+	@staticmethod
+	def params_key(width, directed, within_doc, lemma, filters):
+		'''
+		Returns a string identifying the counting parameters (saved with the 
+		state, see save and ``Intertext.co_words_state``)
+		'''
+		def plain(value):
+			if isinstance(value, (set, frozenset)):
+				return sorted(value)
+			if isinstance(value, (list, tuple)):
+				return list(value)
+			return value
+		return json.dumps([width, directed, within_doc, lemma, 
+			dict((k, plain(v)) for k, v in (filters or {}).iteritems())], 
+			sort_keys=True)
+
+	@property
+	def key(self):
+		return self.params_key(self.width, self.directed, self.within_doc, 
+			self.lemma, self.filters)
+
+	def sync(self, texts, n_jobs=1):
+		'''
+		Updates the counts to the docs of texts: counts the texts that are 
+		new or whose doc changed and removes the labels of the others. Texts
+		that did not change since the last sync (same text and version) are 
+		skipped without accessing their docs. Returns the number of docs 
+		counted.
+		'''
+		current = dict((t.label, t) for t in texts 
+			if t.has_doc or t.cleantext_path)
+		for label in self.sources.keys():
+			if label not in current:
+				self.remove(label)
+		digests = {}
+		def changed():
+			for label, t in current.iteritems():
+				ref, version, digest = self.sources.get(label, (None, None, None))
+				if ref is not None and ref() is t and version == t._version:
+					continue
+				doc = t.doc
+				digests[label] = self.digest(doc)
+				if label in self.sources and digests[label] == digest:
+					self.sources[label] = (weakref.ref(t), t._version, digest)
+					continue
+				yield label, doc
+		n = 0
+		for counts in co_words_counts(changed(), width=self.width, 
+			directed=self.directed, lemma=self.lemma, n_jobs=n_jobs, 
+			**self.filters):
+			label = counts[0]
+			self.remove(label)
+			self.add_doc_counts(*counts)
+			self.sources[label] = (weakref.ref(current[label]), 
+				current[label]._version, digests[label])
+			n += 1
+		return n
+
+	@staticmethod
+	def digest(doc):
+		return hashlib.sha1(doc.text.encode(u'utf-8')).hexdigest() if doc else None
+
+	def save(self, path):
+		labels = sorted(self.docs)
+		np.savez_compressed(path, 
+			params=self.key, 
+			terms=json.dumps(self.terms),
+			labels=json.dumps(labels),
+			digests=json.dumps([self.sources.get(l, (None, None, None))[2] for l in labels]),
+			sizes=np.array([len(self.docs[l][0]) for l in labels], dtype=np.int64),
+			keys=np.concatenate([self.docs[l][0] for l in labels] or [[]]).astype(np.int64),
+			counts=np.concatenate([self.docs[l][1] for l in labels] or [[]]).astype(np.int32))
+
+	@classmethod
+	def load(cls, path):
+		'''
+		Returns the state saved at path (on the next sync, docs whose text 
+		did not change are not counted again)
+		'''
+		data = np.load(path)
+		params = json.loads(data[u'params'].item())
+		if len(params) != 5:
+			raise ValueError(u'State at "{}" lacks lemma and word filters, '
+				u'count it again'.format(path))
+		width, directed, within_doc, lemma, filters = params
+		cw = cls(width=width, directed=directed, within_doc=within_doc, 
+			lemma=lemma, filters=filters)
+		cw.ids(json.loads(data[u'terms'].item()))
+		ends = np.cumsum(data[u'sizes'])
+		keys, counts = data[u'keys'], data[u'counts']
+		for label, digest, start, end in itertools.izip(
+			json.loads(data[u'labels'].item()), json.loads(data[u'digests'].item()),
+			ends - data[u'sizes'], ends):
+			cw.add_counts(label, keys[start:end], counts[start:end])
+			if digest:
+				cw.sources[label] = (None, None, digest)
+		return cw
+
+
 ### Intertext Class
 ###############################################################################
 class Intertext(object):
@@ -613,6 +1925,9 @@ class Intertext(object):
 
 	def __init__(self, name, texts=None):
 		self.name = name
+		self._version = 0 # incremented whenever texts or their data change
+		self._views = {} # name -> (version, cached view)
+		self._co_words_states = {} # co_words parameters -> IncrementalCoWords
 		self.texts = texts
 		# self.refresh_corpus()
 
@@ -639,15 +1954,56 @@ class Intertext(object):
 
 	@property
 	def docs(self):
-		return [t.doc for t in self._texts if t.doc]
+		'''
+		Iterates over the docs of the texts, parsing them on demand (see 
+		``Text.doc`` and ``DocLRU``)
+		'''
+		for t in self._texts:
+			doc = t.doc
+			if doc:
+				yield doc
+
+	def _lazy_docs(self):
+		'''
+		Yields (label, function returning the doc) for the texts with a doc 
+		(see co_words_counts)
+		'''
+		for t in self._texts:
+			if t.has_doc or t.cleantext_path:
+				yield t.label, (lambda t=t: t.doc)
+
+	def _touch(self):
+		self._version += 1
+
+	def _view(self, name, compute):
+		'''
+		Returns the view computed by compute, recomputing it only if the 
+		intertext changed since it was last computed
+		'''
+		version, view = self._views.get(name, (None, None))
+		if version != self._version:
+			view = compute()
+			self._views[name] = (self._version, view)
+		return view
 
 	@property
 	def texts(self):
-		return sorted(list(self._texts), key=Text.call_label)
+		return list(self._view(u'texts', 
+			lambda: sorted(list(self._texts), key=Text.call_label)))
+
+	def iter_texts(self):
+		'''
+		Iterates over the texts without sorting them
+		'''
+		return iter(self._texts)
 
 	@texts.setter
 	def texts(self, texts):
+		for t in getattr(self, u'_texts', ()):
+			t._intertexts.discard(self)
 		self._texts = set()
+		self._cited_by = collections.defaultdict(set) # cited -> citing texts
+		self._touch()
 		if texts:
 			self.add_texts(texts)
 
@@ -655,60 +2011,169 @@ class Intertext(object):
 		if isinstance(texts, list):
 			for i in texts:
 				if isinstance(i, Text):
-					self._texts.add(i._original)
+					self._add_text(i._original)
 				elif isinstance(i, dict):
-					self._texts.add(Text(**i)._original)
+					self._add_text(Text(**i)._original)
 				else:
 					raise ValueError(u'Texts in list must be Text or dict')
 		elif isinstance(texts, Text):
-			self._texts.add(texts._original)
+			self._add_text(texts._original)
 		elif isinstance(texts, dict):
-			self._texts.add(Text(**i)._original)
+			self._add_text(Text(**texts)._original)
 		else:
 			raise ValueError(u'Texts must be list, Text, or dict')
 
+	def _add_text(self, text):
+		if text in self._texts:
+			return
+		self._texts.add(text)
+		text._intertexts.add(self)
+		for c in text._cites:
+			self._index_citation(text, c)
+		self._touch()
+
+	def remove_texts(self, texts):
+		if isinstance(texts, Text):
+			texts = [texts]
+		if not isinstance(texts, list) or not all(isinstance(i, Text) for i in texts):
+			raise ValueError(u'Texts must be list of Text or Text')
+		for i in texts:
+			self._remove_text(i._original)
+
+	def _remove_text(self, text):
+		if not text in self._texts:
+			return
+		self._texts.discard(text)
+		text._intertexts.discard(self)
+		self._unindex_citations(text)
+		self._touch()
+
+	def _index_citation(self, citing, cited):
+		self._cited_by[cited].add(citing)
+
+	def _unindex_citations(self, citing):
+		for c in citing._cites:
+			citers = self._cited_by.get(c)
+			if citers is not None:
+				citers.discard(citing)
+				if not citers:
+					del self._cited_by[c]
+
+	def cited_by(self, text):
+		'''
+		Returns the texts of the intertext citing text
+		'''
+		return sorted(list(self._cited_by.get(text, ())), key=Text.call_label, reverse=True)
+
+	def in_degree(self, text):
+		'''
+		Returns the number of texts of the intertext citing text
+		'''
+		return len(self._cited_by.get(text, ()))
+
+	@property
+	def in_degrees(self):
+		'''
+		Returns a dict mapping each cited text to its number of citing texts
+		'''
+		return dict((c, len(citers)) for c, citers in self._cited_by.iteritems())
+
 	@property
 	def authors(self):
-		return sorted(list(set(a for t in self._texts for a in t.authors)), key=Actor.call_label)
+		return list(self._view(u'authors', 
+			lambda: sorted(self.iter_authors(), key=Actor.call_label)))
+
+	def iter_authors(self):
+		'''
+		Iterates over the authors without sorting them
+		'''
+		return iter(self._view(u'author_set', 
+			lambda: set(a for t in self._texts for a in t._authors)))
 
 	@property
 	def editors(self):
-		return sorted(list(set(a for t in self._texts for a in t.editors)), key=Actor.call_label)
+		return list(self._view(u'editors', 
+			lambda: sorted(self.iter_editors(), key=Actor.call_label)))
+
+	def iter_editors(self):
+		'''
+		Iterates over the editors without sorting them
+		'''
+		return iter(self._view(u'editor_set', 
+			lambda: set(a for t in self._texts for a in t._editors)))
 
 	@property
 	def co_authors(self):
-		edgelist = ((d,a) for d in self._texts for a in d.authors)
-		return co_occurrences(edgelist)
+		return self.co_occurrences(u'co_authors')
 
 	@property
 	def co_editors(self):
-		edgelist = ((d,a) for d in self._texts for a in d.editors)
-		return co_occurrences(edgelist)
+		return self.co_occurrences(u'co_editors')
 
 	@property
 	def cited_texts(self):
-		return sorted(set([c for t in self._texts for c in t.cites]), key=Text.call_label)
+		return list(self._view(u'cited_texts', 
+			lambda: sorted(list(self._cited_by.iterkeys()), key=Text.call_label)))
+
+	def iter_cited_texts(self):
+		'''
+		Iterates over the cited texts without sorting them
+		'''
+		return iter(self._view(u'cited_set', lambda: tuple(self._cited_by)))
 
 	@property
 	def citations(self):
-		return [(d,c) for d in self._texts for c in d.cites]
+		return list(self._view(u'citations', 
+			lambda: [(d,c) for d in self._texts for c in d.cites]))
+
+	def iter_citations(self):
+		'''
+		Iterates over all (citing, cited) pairs without sorting them
+		'''
+		return ((d,c) for d in self._texts for c in d._cites)
 
 	@property
 	def co_citations(self):
-		edgelist = ((d,c) for d in self._texts for c in d.cites)
-		return co_occurrences(edgelist)
+		return self.co_occurrences(u'co_citations')
 
 	@property
 	def bibliographic_coupling(self):
-		edgelist = ((d,c) for d in self._texts for c in d.cites)
-		return co_occurrences(edgelist, focus=u'source')
+		return self.co_occurrences(u'bibliographic_coupling')
+
+	def co_occurrences(self, kind=u'co_citations', connectors=True, 
+		min_weight=1, top_k_per_node=None):
+		'''
+		Returns co-occurrences computed with sparse matrix products 
+		(see sparse_co_occurrences)
+		- kind = 'co_citations', 'bibliographic_coupling', 'co_authors' or 
+		  'co_editors'
+		- connectors: If True, returns a dict mapping each pair to its set of
+		  connectors (as co_occurrences), if False, a weighted edge list
+		- min_weight = only keep pairs with at least this many connectors
+		- top_k_per_node = only keep pairs among the k heaviest of a node
+		'''
+		if kind in [u'co_citations', u'bibliographic_coupling']:
+			edgelist = list(self.iter_citations())
+		elif kind == u'co_authors':
+			edgelist = [(d,a) for d in self._texts for a in d._authors]
+		elif kind == u'co_editors':
+			edgelist = [(d,a) for d in self._texts for a in d._editors]
+		else:
+			raise ValueError(u'kind must be "co_citations", '\
+				u'"bibliographic_coupling", "co_authors" or "co_editors"')
+		focus = u'source' if kind == u'bibliographic_coupling' else u'target'
+		return sparse_co_occurrences(edgelist, focus=focus, connectors=connectors,
+			min_weight=min_weight, top_k_per_node=top_k_per_node)
 
 
 	def load_Zotero(self, Z, basic=True, citations=True, fulltext=False, 
 		upload_new=True, match_hierarchy=MATCH_HIERARCHY, 
-		min_percent_titlelength=80, same_firstletter=True):
+		min_percent_titlelength=80, same_firstletter=True, match_cache=None):
 		'''
 		Loads data from Zotero Collection
+		- match_cache = path or MatchCache: citation matches are read from and
+		  written to this cache, so unchanged citations are not matched again
+		  as long as the loaded texts stay the same
 		'''
 		# What about refresh? Check workflow
 		print u'\nLoading Zotero data...'
@@ -744,6 +2209,20 @@ class Intertext(object):
 					zot_citfiles.append((citfile, t))
 		if citations:
 			zot_uploads = set()
+			index = MatchIndex(self)
+			params = {
+				u'match_hierarchy': match_hierarchy, 
+				u'min_percent_titlelength': min_percent_titlelength,
+				u'same_firstletter': same_firstletter,
+				u'nlev': index.nlev,
+				u'date_span': index.date_span,
+				}
+			if isinstance(match_cache, basestring):
+				match_cache = MatchCache(match_cache)
+			if match_cache is not None:
+				match_cache.validate(self)
+				by_reference = dict(
+					(json.dumps(MatchCache.reference(t)), t) for t in self._texts)
 			for citfile in zot_citfiles:
 				citfile, citing = citfile
 				print u'\t...loading citations from "{}"'.format(
@@ -752,11 +2231,31 @@ class Intertext(object):
 				for c in parse_citlist(citlist):
 					print u'\t\t...adding {}'.format(
 						u'_'.join([c[u'date'], c[u'title'][:15]]))
+					cached = match_cache.get(c, **params) if match_cache else None
+					if cached and cached[0]:
+						match = by_reference.get(json.dumps(cached[0]))
+						if match is not None:
+							print '\t\t\t...matches {} (at level {}, cached)'.format(match, cached[1])
+							citing.add_citations_to(match)
+							if upload_new:
+								zot_uploads.add(match)
+							continue
+					citation = c
 					c = Text(**c)
-					matches = c.best_matches_in(self.texts, 
-						match_hierarchy=MATCH_HIERARCHY,
-						min_percent_titlelength=min_percent_titlelength,
-						same_firstletter=same_firstletter) # takes long, can I speed up somehow? 
+					if cached and not cached[0]:
+						matches = (None, None)
+					else:
+						candidates = index.candidates(c)
+						matches = c.best_matches_in(
+							sorted(list(candidates), key=Text.call_label),
+							match_hierarchy=match_hierarchy,
+							min_percent_titlelength=min_percent_titlelength,
+							same_firstletter=same_firstletter,
+							nlev=index.nlev, date_span=index.date_span)
+						if match_cache is not None:
+							match_cache.set(citation, 
+								matches[0][0] if matches[0] else None, 
+								matches[1], candidates, c, **params)
 					if matches[0]:
 						c = matches[0][0]
 						print u'\t\t...adding {}'.format(c)
@@ -781,6 +2280,8 @@ class Intertext(object):
 				print u'\n...AFTER: not_uploads:', len(zot_uploads_old.difference(zot_uploads))
 				for i in zot_uploads_old.difference(zot_uploads):
 					print i
+			if match_cache is not None:
+				match_cache.save()
 
 		clean_originals(Actor) # to remove dead weakrefs
 		clean_originals(Text) # to remove dead weakrefs
@@ -792,7 +2293,9 @@ class Intertext(object):
 	def co_words(self, min_freq=3, width=4, 
 		directed=False, lemma=True, within_doc=False, connectors=False,
 		filter_stops=True, filter_punct=True, filter_nums=True,
-		include_pos=None, exclude_pos=None, output=u'generator'):
+		include_pos=None, exclude_pos=None, output=u'generator', n_jobs=1,
+		path=None, spill_dir=None, n_shards=64, approximate=False, 
+		max_pairs=100000, incremental=False):
 		''' 
 		Returns co_words for the intertext
 		- min_freq = only output co_words that occur more than or equal to this threshold
@@ -800,6 +2303,19 @@ class Intertext(object):
 		- within_doc = if True: counts each co-ocurrence within doc, if False: max 1 co-occurrence per doc
 		- connectors: If True, shows connectors (only applicable if output is either 'gnerator' or 'list')
 		- directed: If True, DiGraph is used to differentiate between (emissions, trading) and (trading, emissions)
+		- n_jobs = number of worker processes counting the documents (-1 for all cpus)
+		- output = 'generator', 'list', 'nx' or 'file' (edge list written to path)
+		- spill_dir: If given, pair counts are spilled to n_shards files in a 
+		  temporary directory inside spill_dir and merged on output, so that 
+		  the pairs never have to fit into memory (see SpilledCoWords)
+		- approximate: If True, counts with a fixed budget of max_pairs 
+		  counters. Reported freqs are lower bounds, off by at most 'error' 
+		  (<= total count / (max_pairs+1)), see ApproxCoWords
+		- incremental: If True, the counts of each text are kept between 
+		  calls (per combination of the counting parameters) and only texts 
+		  added, removed or re-parsed since the last call are (re)counted, 
+		  see IncrementalCoWords and co_words_state (cannot be combined with
+		  approximate or spill_dir)
 		To Do:
 		- Option for connector = author?
 		'''
@@ -817,39 +2333,118 @@ class Intertext(object):
 			u'include_pos':include_pos,
 			u'exclude_pos':exclude_pos, # Note that min_freq is used here not within textacy.extract.words() but for co-words! 
 		}
-		G = nx.DiGraph() if directed else nx.Graph()
-		label_tokens_pairs = ((
-			text.label, list(textacy.extract.words(text.doc, **kwargs))) 
-			for text in self._texts if text.doc)
-		for ltp in label_tokens_pairs:
-			for win in sliding_window(ltp[1], width):
-				win = [t.lemma_ for t in win] \
-					if lemma else [t.lower_ for t in win]
-				for i in range(1, width):
-					if not G.has_edge(win[0], win[i]):
-						G.add_edge(win[0], win[i], 
-							freq = 1, 
-							connectors = {ltp[0]:1})
-					elif not within_doc:
-						if not ltp[0] in G[win[0]][win[i]]\
-							[u'connectors'].iterkeys():
-							G[win[0]][win[i]][u'freq'] += 1
-							G[win[0]][win[i]][u'connectors'][ltp[0]] = 1
-					elif within_doc:
-						G[win[0]][win[i]][u'freq'] += 1
-						if not ltp[0] in G[win[0]][win[i]][u'connectors'].iterkeys():
-							G[win[0]][win[i]][u'connectors'][ltp[0]] = 1
-						else:
-							G[win[0]][win[i]][u'connectors'][ltp[0]] += 1
+		if output == u'file' and not path:
+			raise ValueError(u'Provide path for output "file"')
+		params = dict(width=width, directed=directed, within_doc=within_doc,
+			connectors=connectors or output == u'nx')
+		if incremental:
+			if approximate or spill_dir is not None:
+				raise ValueError(
+					u'incremental supports neither approximate nor spill_dir')
+			cw = self.co_words_state(width=width, directed=directed, 
+				lemma=lemma, within_doc=within_doc, n_jobs=n_jobs, **kwargs)
+			if output==u'generator':
+				return cw.edges(min_freq=min_freq, connectors=connectors)
+			elif output==u'list':
+				return list(cw.edges(min_freq=min_freq, connectors=connectors))
+			elif output==u'nx':
+				return cw.graph(min_freq=min_freq)
+			elif output==u'file':
+				return cw.write(path, min_freq=min_freq, connectors=connectors)
+		if approximate:
+			if connectors or spill_dir is not None:
+				raise ValueError(u'approximate supports neither connectors nor spill_dir')
+			cw = ApproxCoWords(max_pairs=max_pairs, **params)
+		elif spill_dir is not None:
+			cw = SpilledCoWords(path=spill_dir, n_shards=n_shards, **params)
+		else:
+			cw = CoWords(**params)
+		for counts in co_words_counts(self._lazy_docs(), width=width, directed=directed, 
+			lemma=lemma, n_jobs=n_jobs, **kwargs):
+			cw.add_doc_counts(*counts)
 		if output==u'generator':
-			return (e if connectors else e[:2]+({u'freq':e[2][u'freq']},) 
-				for e in G.edges(data=True) if e[2][u'freq']>=min_freq)
-		elif output==u'list':
-			return [e if connectors else e[:2]+({u'freq':e[2][u'freq']},) 
-				for e in G.edges(data=True) if e[2][u'freq']>=min_freq]
-		elif output==u'nx':
-			G.remove_edges_from([e for e in G.edges(data=True) if e[2][u'freq']<min_freq])
-			return G
+			return closing_generator(
+				cw.edges(min_freq=min_freq, connectors=connectors), cw.close)
+		try:
+			if output==u'list':
+				return list(cw.edges(min_freq=min_freq, connectors=connectors))
+			elif output==u'nx':
+				return cw.graph(min_freq=min_freq)
+			elif output==u'file':
+				return cw.write(path, min_freq=min_freq, connectors=connectors)
+		finally:
+			cw.close()
+
+	def co_words_state(self, width=4, directed=False, lemma=True, 
+		within_doc=False, n_jobs=1, state=None, **kwargs):
+		'''
+		Returns the IncrementalCoWords kept for these parameters, synced to 
+		the current texts (kwargs are the word filters of co_words)
+		- state = IncrementalCoWords (e.g. loaded from disk) to use from now on;
+		  it must have been counted with the same parameters (including lemma 
+		  and the word filters), otherwise ValueError is raised
+		'''
+		key = IncrementalCoWords.params_key(width, directed, within_doc, 
+			lemma, kwargs)
+		if state is not None:
+			if state.key != key:
+				raise ValueError(u'State was counted with other parameters: '
+					u'{} instead of {}'.format(state.key, key))
+			state.version = None
+			self._co_words_states[key] = state
+		cw = self._co_words_states.get(key)
+		if cw is None:
+			cw = self._co_words_states[key] = IncrementalCoWords(
+				width=width, directed=directed, within_doc=within_doc, 
+				lemma=lemma, filters=kwargs)
+		if cw.version != self._version:
+			cw.sync(self._texts, n_jobs=n_jobs)
+			cw.version = self._version
+		return cw
+
+	def build_docs(self, batch_size=50, n_process=1, lang=u'en_core_web_sm', 
+		disable=(), refresh=False):
+		'''
+		Parses the cleantexts of all texts without doc (or of all texts with 
+		cleantext_path if refresh=True) in batches through one spacy 
+		pipeline and attaches the docs (see parse_docs). Use this to 
+		prefetch the docs, which are otherwise parsed lazily one by one. Docs 
+		in ``Text.doc_cache`` are loaded instead of parsed.
+		With a ``Text.doc_lru``, only as many docs are built as it keeps: 
+		the first max_docs of them, and building stops as soon as one of the
+		docs built here is dropped again (max_bytes). The other texts are 
+		parsed lazily.
+		- lang = name of a spacy model or a loaded spacy Language
+		- disable = pipeline components not to run (see load_model)
+		- n_process = number of worker processes (-1 for all cpus)
+		Returns the number of docs built
+		'''
+		print u'\nBuilding docs for "{}"'.format(self.name)
+		pending = [t for t in self.texts if t.cleantext_path 
+			and (refresh or not t.has_doc)]
+		lru = Text.doc_lru
+		if lru is not None and lru.max_docs is not None:
+			pending = pending[:lru.max_docs]
+		nlp = load_model(lang, disable=disable)
+		if Text.doc_cache is not None:
+			docs = Text.doc_cache.parse_all((t.cleantext for t in pending), nlp, 
+				batch_size=batch_size, n_process=n_process)
+		else:
+			docs = parse_docs((t.cleantext_path for t in pending), nlp, 
+				batch_size=batch_size, n_process=n_process, read=read_text)
+		built = 0
+		try:
+			for text, doc in itertools.izip(pending, docs):
+				text._set_doc(doc, metadata=None, lang=nlp, from_cleantext=True)
+				text._touch()
+				built += 1
+				if lru is not None and not pending[0].has_doc:
+					print u'\t...doc_lru is full, other docs are parsed lazily'
+					break
+		finally:
+			docs.close()
+		print u'\t...{} docs built'.format(built)
+		return built
 
 	def words_in_context(self, words, ignore_case=True, window_width=50, print_only=True):
 		words_in_context((doc for doc in self.docs), words=words, ignore_case=True, window_width=50, print_only=True)
@@ -872,22 +2467,142 @@ class Intertext(object):
 ### Zotero class
 ###############################################################################
 class Zotero(object):
+	'''
+	Handler for the items of a Zotero collection
+	- cache_path = json file in which the items and the library version 
+	  are kept between sessions, so that refresh only fetches changes
+	- endpoint = base url of the Zotero API (e.g. of a local stand-in server)
+	- concurrency = number of pages of items fetched at the same time
+	'''
+	PAGE_SIZE = 100 # most items the API returns per request
+	BATCH_SIZE = 50 # most items the API accepts per write request
+	RETRY_DELAY = 1.0 # seconds before the first retry (doubled after each)
+	MAX_REFETCHES = 5 # times items are fetched again if the library changed
 	
-	def __init__(self, api_key, library_id, library_type, collection_id=None):
+	def __init__(self, api_key, library_id, library_type, collection_id=None,
+		cache_path=None, endpoint=None, concurrency=4):
 		print u'\nEstablishing Zotero handler...'
 		if collection_id == None:
 			raise ValueError(u'Provide collection_id')
 		self.web = zotero.Zotero(library_id, library_type, api_key)
+		if endpoint:
+			self.web.endpoint = endpoint
 		self.library_id = library_id
 		self.library_type = library_type
 		self.api_key = api_key
 		self.collection_id = collection_id
+		self.cache_path = cache_path
+		self.concurrency = concurrency
+		self._local = threading.local() # requests.Session of each thread
+		self._backoff_until = 0.0
+		self.version = None # library version the items are synced to
+		self._items = collections.OrderedDict() # key -> item data
+		self.load_cache()
 		self.refresh()
 		print u'...done.'
 
-	def refresh(self):
-		self._data = [i[u'data'] for i in self.web.everything(
-			self.web.collection_items(self.collection_id))]
+	def _cache_id(self):
+		return [unicode(self.library_id), self.library_type, self.collection_id]
+
+	def load_cache(self):
+		if not self.cache_path or not os.path.isfile(self.cache_path):
+			return
+		with open(self.cache_path) as f:
+			cache = json.load(f)
+		if cache.get(u'id') == self._cache_id():
+			self.version = cache[u'version']
+			self._items = collections.OrderedDict(
+				(i[u'key'], i) for i in cache[u'items'])
+
+	def save_cache(self):
+		if not self.cache_path:
+			return
+		tmp = self.cache_path + u'.tmp'
+		with open(tmp, u'w') as f:
+			json.dump({u'id': self._cache_id(), u'version': self.version, 
+				u'items': self._items.values()}, f)
+		os.rename(tmp, self.cache_path)
+
+	def refresh(self, full=False):
+		'''
+		Syncs the items of the collection. Unless full=True or nothing was 
+		synced before, only the items modified or deleted since the last 
+		synced library version are fetched (nothing if the library did not 
+		change).
+		'''
+		version = self.web.last_modified_version()
+		if full or self.version is None:
+			self._items = collections.OrderedDict((i[u'key'], i) 
+				for i in self._fetch_items(
+					u'/collections/{}/items'.format(self.collection_id)))
+		elif version != self.version:
+			changed = self._fetch_items(
+				u'/collections/{}/items'.format(self.collection_id), 
+				since=self.version)
+			for key in itertools.chain(
+				self.web.item_versions(since=self.version), 
+				self.web.deleted(since=self.version).get(u'items', [])):
+				self._items.pop(key, None) # modified elsewhere or deleted
+			self._items = collections.OrderedDict(
+				[(i[u'key'], i) for i in changed] + self._items.items())
+		if version != self.version or full:
+			self.version = version
+			self.save_cache()
+		self._data = self._items.values()
+		self._index()
+
+	def _index(self):
+		'''
+		Builds the views and lookup tables of the synced items, so that 
+		properties and *_by_key lookups do not scan all items again
+		'''
+		self._by_key = collections.defaultdict(list)
+		self._by_type = collections.defaultdict(list)
+		self._by_parent_tag = collections.defaultdict(list)
+		for i in self._data:
+			self._by_key[i.get(u'key')].append(i)
+			self._by_type[i[u'itemType']].append(i)
+			if i[u'itemType'] in (u'attachment', u'note') and i.get(u'parentItem'):
+				for tag in set(t.values()[0] for t in i[u'tags']): # once per item
+					self._by_parent_tag[(i[u'parentItem'], tag)].append(i)
+		attachments = self._by_type[u'attachment']
+		self._views = {
+			u'texts': [i for i in self._data 
+				if i[u'itemType'] not in (u'attachment', u'note')],
+			u'attachments': attachments,
+			u'citnotes': [i for i in self._by_type[u'note'] 
+				if u'parentItem' in i and self._has_tag(i, u'RDA citations')],
+			u'citfiles': [i for i in attachments if self._is_citfile(i)],
+			u'rawtexts': [i for i in attachments 
+				if self._is_linked_text(i, u'RDA rawtext')],
+			u'cleantexts': [i for i in attachments 
+				if self._is_linked_text(i, u'RDA cleantext')],
+			}
+
+	@staticmethod
+	def _has_tag(item, tag):
+		return tag in [t.values()[0] for t in item[u'tags']]
+
+	@staticmethod
+	def _is_citfile(item):
+		return (item[u'itemType'] == u'attachment'
+			and item.get(u'contentType') in (u'text/html', u'text/plain')
+			and bool(item.get(u'parentItem'))
+			and Zotero._has_tag(item, u'RDA citations'))
+
+	@staticmethod
+	def _is_linked_text(item, tag):
+		return (item[u'itemType'] == u'attachment' 
+			and all(k in item for k in (u'parentItem', u'path'))
+			and Zotero._has_tag(item, tag))
+
+	def _attachment_by_key(self, key, tag, test, name):
+		result = [i for i in self._by_parent_tag.get((key, tag), []) if test(i)]
+		if result:
+			if len(result) > 1:
+				raise ValueError(u'More than one {} of parent "{}"'.format(name, key))
+			return result[0]
+		return None
 
 	@property
 	def data(self):
@@ -895,68 +2610,39 @@ class Zotero(object):
 
 	@property
 	def texts(self):
-		return [i for i in self._data if not any(
-			i[u'itemType'] == t for t in [u'attachment', u'note'])]
+		return list(self._views[u'texts'])
 
 	@property
 	def attachments(self):
-		return [i for i in self._data 
-			if i[u'itemType'] == u'attachment']
+		return list(self._views[u'attachments'])
 
 	@property
 	def citnotes(self):
-		return [i for i in self._data 
-			if i[u'itemType'] == u'note'
-			and u'parentItem' in i.iterkeys()
-			and u'RDA citations' in [t.values()[0] for t in i[u'tags']]]
+		return list(self._views[u'citnotes'])
 	
 	@property
 	def citfiles(self):
-		return [i for i in self._data 
-			if i[u'itemType'] == u'attachment'
-			and any(
-				i[u'contentType'] == t for t in [u'text/html', u'text/plain'])
-			and i.get(u'parentItem')
-			and u'RDA citations' in [t.values()[0] for t in i[u'tags']]]
+		return list(self._views[u'citfiles'])
 
 	def citfile_by_key(self, key):
-		result = [i for i in self.citfiles if i.get(u'parentItem') == key]
-		if result:
-			if len(result) > 1:
-				raise ValueError(u'More than one citfile of parent "{}"'.format(key))
-			return result[0]
-		return None
+		return self._attachment_by_key(
+			key, u'RDA citations', self._is_citfile, u'citfile')
 		
 	@property
 	def rawtexts(self):
-		return [i for i in self._data
-			if i['itemType'] == u'attachment' 
-			and all(k in i.iterkeys() for k in [u'parentItem', u'path'])
-			and u'RDA rawtext' in [t.values()[0] for t in i[u'tags']]]
+		return list(self._views[u'rawtexts'])
 
 	def rawtext_by_key(self, key):
-		result = [i for i in self.rawtexts if i.get(u'parentItem') == key]
-		if result:
-			if len(result) > 1:
-				raise ValueError(u'More than one rawtexts of parent "{}"'.format(key))
-			return result[0]
-		return None
+		return self._attachment_by_key(key, u'RDA rawtext', 
+			lambda i: self._is_linked_text(i, u'RDA rawtext'), u'rawtexts')
 
 	@property
 	def cleantexts(self):
-		return [i for i in self._data
-			if i[u'itemType'] == u'attachment' 
-			and all(k in i.iterkeys() for k in [u'parentItem', u'path'])
-			and u'RDA cleantext' in [t.values()[0] for t in i[u'tags']]]
-
+		return list(self._views[u'cleantexts'])
 
 	def cleantext_by_key(self, key):
-		result = [i for i in self.cleantexts if i.get(u'parentItem') == key]
-		if result:
-			if len(result) > 1:
-				raise ValueError(u'More than one cleantexts of parent "{}"'.format(key))
-			return result[0]
-		return None
+		return self._attachment_by_key(key, u'RDA cleantext', 
+			lambda i: self._is_linked_text(i, u'RDA cleantext'), u'cleantexts')
 
 	@property
 	def publicationTitles(self, filename=None):
@@ -973,17 +2659,148 @@ class Zotero(object):
 		'''
 		Returns a Zotero item given its key
 		'''
-		result = [i for i in self._data if i.get(u'key') == key]
+		result = self._by_key.get(key)
 		if result:
 			if len(result) > 1:
 				raise ValueError(u'More than one item with key "{}"'.format(key))
 			return result[0]
 		return None
 
-	def upload_cleantexts(self, source):
+	def session(self):
+		'''
+		Returns the requests.Session of the calling thread, which keeps its 
+		connections open between requests. Sessions are not shared between 
+		threads, since they are not thread-safe.
+		'''
+		session = getattr(self._local, u'session', None)
+		if session is None:
+			session = self._local.session = requests.Session()
+			session.headers.update(self.web.default_headers())
+		return session
+
+	def _request(self, method, path, retries=5, **kwargs):
+		'''
+		Sends a request to the Zotero API over a reused connection. A Backoff 
+		header delays the next request. Rate limited (429) or unavailable 
+		(503) responses and connection errors are retried after Retry-After 
+		seconds (or after RETRY_DELAY seconds, doubled with each attempt).
+		'''
+		for attempt in range(retries + 1):
+			wait = self._backoff_until - time.time()
+			if wait > 0:
+				time.sleep(wait)
+			delay = self.RETRY_DELAY * 2 ** attempt
+			try:
+				r = self.session().request(
+					method, self.web.endpoint + path, **kwargs)
+			except requests.exceptions.ConnectionError:
+				if attempt == retries:
+					raise
+				print u'\t...connection failed, retrying in {}s'.format(delay)
+				time.sleep(delay)
+				continue
+			if r.headers.get(u'Backoff'):
+				self._backoff_until = time.time() + float(r.headers[u'Backoff'])
+			if r.status_code not in (429, 503) or attempt == retries:
+				return r
+			delay = float(r.headers.get(u'Retry-After', delay))
+			print u'\t...rate limited, retrying in {}s'.format(delay)
+			time.sleep(delay)
+
+	def _fetch_items(self, path, **params):
+		'''
+		Returns the data of all items listed at path (e.g. 
+		u'/collections/KEY/items'), in the order of the API. Once the first 
+		page has given the total, the other pages are fetched by up to 
+		self.concurrency threads. If the library changed in between, 
+		everything is fetched again, up to MAX_REFETCHES times.
+		'''
+		path = u'/{}/{}{}'.format(self.web.library_type, self.library_id, path)
+		params = dict(params, format=u'json', limit=self.PAGE_SIZE)
+		def page(start):
+			r = self._request(u'GET', path, params=dict(params, start=start))
+			r.raise_for_status()
+			return r.headers.get(u'Last-Modified-Version'), r
+		for attempt in range(self.MAX_REFETCHES + 1):
+			version, first = page(0)
+			items = first.json()
+			total = int(first.headers.get(u'Total-Results', len(items)))
+			starts = range(self.PAGE_SIZE, total, self.PAGE_SIZE)
+			if self.concurrency > 1 and len(starts) > 1:
+				pool = ThreadPool(min(self.concurrency, len(starts)))
+				try:
+					pages = pool.map(page, starts)
+				finally:
+					pool.close()
+					pool.join()
+			else:
+				pages = map(page, starts)
+			if all(v == version for v, _ in pages):
+				break
+			if attempt == self.MAX_REFETCHES:
+				raise ValueError(u'Library kept changing while fetching items, '
+					u'tried {} times'.format(attempt + 1))
+			print u'\t...library changed while fetching, fetching again'
+		return [i[u'data'] for i in itertools.chain(
+			items, *(r.json() for _, r in pages))]
+
+	def write_items(self, items, checkpoint=None, retries=5):
+		'''
+		Creates Zotero items (or updates them, if they have a key and version) 
+		in batches of BATCH_SIZE items per request.
+		- checkpoint = json file recording the items written so far, so that 
+		  a failed run can be repeated without writing them twice. Items of 
+		  a batch that was written but whose response got lost (412 on 
+		  retry) are recorded as unknown and are not written again either.
+		- retries = attempts per batch on rate limits and connection errors
+		Returns the keys of the items (None for failed items and for items 
+		whose key is unknown).
+		'''
+		done, unknown = {}, set()
+		if checkpoint and os.path.isfile(checkpoint):
+			with open(checkpoint) as f:
+				state = json.load(f)
+			done, unknown = state[u'keys'], set(state[u'unknown'])
+		digests = [hashlib.sha1(json.dumps(i, sort_keys=True)).hexdigest() 
+			for i in items]
+		keys = [done.get(d) for d in digests]
+		todo = [n for n, d in enumerate(digests) 
+			if d not in done and d not in unknown]
+		path = u'/{}/{}/items'.format(self.web.library_type, self.library_id)
+		for start in range(0, len(todo), self.BATCH_SIZE):
+			batch = todo[start:start + self.BATCH_SIZE]
+			# the write token makes retries of an already written batch fail
+			# with 412 instead of creating the items twice
+			r = self._request(u'POST', path, retries=retries, 
+				data=json.dumps([items[n] for n in batch]), 
+				headers={u'Content-Type': u'application/json', 
+					u'Zotero-Write-Token': uuid.uuid4().hex})
+			if r.status_code == 412:
+				print u'\t...batch was already written, keys unknown'
+				unknown.update(digests[n] for n in batch)
+				result = {}
+			else:
+				r.raise_for_status()
+				result = r.json()
+			for status in (u'success', u'unchanged'):
+				for i, key in result.get(status, {}).iteritems():
+					n = batch[int(i)]
+					keys[n] = done[digests[n]] = key
+			for i, error in result.get(u'failed', {}).iteritems():
+				print u'\t...failed to write "{}": {}'.format(
+					items[batch[int(i)]].get(u'title', u''), error.get(u'message'))
+			if checkpoint:
+				tmp = checkpoint + u'.tmp'
+				with open(tmp, u'w') as f:
+					json.dump({u'keys': done, u'unknown': sorted(unknown)}, f)
+				os.rename(tmp, checkpoint)
+		return keys
+
+	def upload_cleantexts(self, source, checkpoint=None):
 		'''
 		uploads new cleantexts from source (text or intertext) 
 		as attachments to zotero library
+		- checkpoint = see write_items
 		'''
 		if not any(isinstance(source, t) for t in [Intertext, Text]):
 			raise ValueError(u'source must be Text or Intertext')
@@ -994,25 +2811,33 @@ class Zotero(object):
 			source = [source]
 		else: # source = Intertext
 			source = source.texts
-		relevant_texts = (text for text in source if text.cleantext_path 
-			and text.cleantext_path not in (i['path'] for i in self.cleantexts)) # allow update of existing attachments?
+		existing = set(i['path'] for i in self.cleantexts)
+		relevant_texts = [text for text in source if text.cleantext_path 
+			and text.cleantext_path not in existing] # allow update of existing attachments?
 		if not relevant_texts:
 			print u'No cleantexts to upload'
 			return
+		template = self.web._attachment_template('linked_file') # see https://github.com/urschrei/pyzotero/blob/master/pyzotero/zotero.py
+		uploads = []
 		for t in relevant_texts:
-			upload = self.web._attachment_template('linked_file') # see https://github.com/urschrei/pyzotero/blob/master/pyzotero/zotero.py
+			upload = copy.deepcopy(template)
 			upload[u'title'] = os.path.split(t.cleantext_path)[1]
 			upload[u'path'] = t.cleantext_path
 			upload[u'tags'] = [{u'tag':u'RDA cleantext'}]
 			upload[u'contentType'] = u'text/html'
+			upload[u'parentItem'] = t.attr[u'key']
 			print u'\tUploading Zotero attachment: "{}"'.format(t.cleantext_path)
-			self.web.create_items([upload],t.attr[u'key'])
+			uploads.append(upload)
+		self.write_items(uploads, checkpoint=checkpoint)
+		self.refresh()
 		return
 
 	def prepare_cleantexts(self, path=u'', replace=False, read_method=u'textract',
-		fix_unicode=True, transliterate=True, **kwargs):
+		fix_unicode=True, transliterate=True, checkpoint=None, **kwargs):
  		""" Reads any textfile tagged in Zotero as 'RDA rawtext' and reates 
  		clean txt.file (to be further hand cleaned), 
+ 		The attachments are created or updated in batches (see write_items 
+ 		for checkpoint).
 
  		To Do: 
  		- allow user specific path?
@@ -1026,14 +2851,16 @@ class Zotero(object):
  			u'...settings for text cleaning: {}'.\
  			format('' if replace else 'not ', kwargs)
  		self.refresh()
+		cleaned = set(c[u'parentItem'] for c in self.cleantexts)
  
  		if replace == True:
 			new_attachments = [{
 				u'rawpath': r[u'path'],
 				u'cleanpath': r[u'path'].rsplit(u'.',1)[0]+'_CLEAN.txt',
 				u'title': os.path.split(r[u'path'].rsplit(u'.',1)[0]+'_CLEAN.txt')[1],
-				u'existing_clean': [c[u'key'] for c in self.cleantexts \
-					if c[u'parentItem'] == r[u'parentItem']],
+				u'existing_clean': [c[u'key'] for c in self._by_parent_tag.get(
+					(r[u'parentItem'], u'RDA cleantext'), [])
+					if self._is_linked_text(c, u'RDA cleantext')],
 				u'parent': r[u'parentItem'],
 				u'tags': [{u'tag':u'RDA cleantext'}]} 
 				for r in self.rawtexts
@@ -1047,13 +2874,14 @@ class Zotero(object):
 				u'parent': r[u'parentItem'],
 				u'tags': [{u'tag': u'RDA cleantext'}]} 
 				for r in self.rawtexts 
-				if not r[u'parentItem'] in [c[u'parentItem'] 
-					for c in self.cleantexts]]
+				if not r[u'parentItem'] in cleaned]
 		else:
 			raise ValueError(u'keyword argument "replace" must be True or False!')
 		if new_attachments:
 			print u'\t...{} file{} found. Please wait...'.\
 				format(len(new_attachments),'s' if len(new_attachments) > 1 else '')
+			template = self.web._attachment_template('linked_file') # see https://github.com/urschrei/pyzotero/blob/master/pyzotero/zotero.py
+			uploads = []
  			for a in new_attachments:
 				cleantext = read_text(a[u'rawpath'], read_method=read_method)
 				cleantext = clean_text(cleantext, **kwargs)
@@ -1064,28 +2892,217 @@ class Zotero(object):
 					f.write(cleantext)
 				
 				### create or update Zotero attachment
-				upload = self.web._attachment_template('linked_file') # see https://github.com/urschrei/pyzotero/blob/master/pyzotero/zotero.py
+				upload = copy.deepcopy(template)
 				upload[u'title'] = a[u'title']
 				upload[u'path'] = a[u'cleanpath']
 				upload[u'tags'] = [{u'tag':u'RDA cleantext'}]
 				upload[u'contentType'] = u'text/html'
 				if not a[u'existing_clean']:
 					print u'\t...creating Zotero attachment: "{}"'.format(a[u'cleanpath'])
-					self.web.create_items([upload],a['parent'])
+					upload[u'parentItem'] = a['parent']
+					uploads.append(upload)
 				else:
 					print u'\t...updating path in existing Zotero '\
 						'attachment: "{}"'.format(a[u'cleanpath'])
-					existing = self.web.item(a['existing_clean'][0])
-					existing[u'data'][u'title'] = upload[u'title']
-					existing[u'data'][u'path'] = upload[u'path']
-					existing[u'data'][u'contentType'] = upload[u'contentType']
-					self.web.update_item(existing)
+					existing = dict(self.item_by_key(a['existing_clean'][0]))
+					existing[u'title'] = upload[u'title']
+					existing[u'path'] = upload[u'path']
+					existing[u'contentType'] = upload[u'contentType']
+					uploads.append(existing)
+			print u'\t...writing {} Zotero attachments'.format(len(uploads))
+			self.write_items(uploads, checkpoint=checkpoint)
+			self.refresh()
 		else:
 			print u'...no files to prepare.'
 
 
 
 
+### ZoteroSQLite class
+###############################################################################
+class ZoteroSQLite(Zotero):
+	'''
+	Offline, read-only handler for the items of a Zotero collection, read 
+	from a local zotero.sqlite database instead of the Zotero web API.
+	Items have the same form as those of the web API, so ZoteroSQLite can 
+	be used wherever a Zotero handler is expected (e.g. load_Zotero).
+	- path = path of zotero.sqlite (a copy is read, so Zotero may be running)
+	- library_id = group id if library_type is u'group' (ignored for u'user')
+	- collection_id = key of the collection
+	- base_dir = linked attachment base directory, to which paths stored 
+	  as relative (u'attachments:...') are resolved
+	'''
+
+	LINK_MODES = {0: u'imported_file', 1: u'imported_url', 
+		2: u'linked_file', 3: u'linked_url'}
+
+	def __init__(self, path, library_id=None, library_type=u'user', 
+		collection_id=None, base_dir=None):
+		print u'\nEstablishing Zotero handler (offline)...'
+		if collection_id == None:
+			raise ValueError(u'Provide collection_id')
+		if not os.path.isfile(path):
+			raise ValueError(u'No Zotero database at "{}"'.format(path))
+		self.web = None
+		self.path = path
+		self.library_id = library_id
+		self.library_type = library_type
+		self.collection_id = collection_id
+		self.base_dir = base_dir
+		self.version = None
+		self._items = collections.OrderedDict()
+		self.refresh()
+		print u'...done.'
+
+	def _connect(self):
+		'''
+		Returns a connection to a temporary copy of the database (with its 
+		journal files), so that a running Zotero and its locks do not matter
+		'''
+		tmpdir = tempfile.mkdtemp()
+		for suffix in (u'', u'-journal', u'-wal'):
+			if os.path.isfile(self.path + suffix):
+				shutil.copy2(self.path + suffix, 
+					os.path.join(tmpdir, u'zotero.sqlite' + suffix))
+		return sqlite3.connect(os.path.join(tmpdir, u'zotero.sqlite')), tmpdir
+
+	def _library(self, db):
+		if self.library_type == u'group':
+			row = db.execute(u'SELECT libraryID FROM groups WHERE groupID = ?', 
+				(self.library_id,)).fetchone()
+		else:
+			row = db.execute(u'SELECT libraryID FROM libraries '
+				u'WHERE type = ?', (self.library_type,)).fetchone()
+		if not row:
+			raise ValueError(u'No {} library "{}" in "{}"'.format(
+				self.library_type, self.library_id or u'', self.path))
+		return row[0]
+
+	def refresh(self, full=False):
+		'''
+		Reads the items of the collection (and their child attachments and 
+		notes) from the database, with one bulk query per table
+		'''
+		db, tmpdir = self._connect()
+		try:
+			self._items = self._read(db)
+		finally:
+			db.close()
+			shutil.rmtree(tmpdir, ignore_errors=True)
+		self._data = self._items.values()
+		self._index()
+
+	def _read(self, db):
+		tables = set(r[0] for r in db.execute(
+			u"SELECT name FROM sqlite_master WHERE type = 'table'"))
+		fields = u'fieldsCombined' if u'fieldsCombined' in tables else u'fields'
+		types = (u'itemTypesCombined' if u'itemTypesCombined' in tables 
+			else u'itemTypes')
+		library = self._library(db)
+		self.version = db.execute(u'SELECT version FROM libraries '
+			u'WHERE libraryID = ?', (library,)).fetchone()[0]
+		row = db.execute(u'SELECT collectionID FROM collections '
+			u'WHERE libraryID = ? AND key = ?', 
+			(library, self.collection_id)).fetchone()
+		if not row:
+			raise ValueError(u'No collection "{}" in "{}"'.format(
+				self.collection_id, self.path))
+		db.execute(u'CREATE TEMP TABLE sel (itemID INTEGER PRIMARY KEY)')
+		db.execute(u'INSERT INTO sel SELECT itemID FROM collectionItems '
+			u'WHERE collectionID = ?', row)
+		def drop_trashed(): # items in the trash and their children
+			if u'deletedItems' in tables:
+				db.execute(u'DELETE FROM sel WHERE itemID IN '
+					u'(SELECT itemID FROM deletedItems)')
+		drop_trashed()
+		for table in (u'itemAttachments', u'itemNotes'):
+			db.execute(u'INSERT OR IGNORE INTO sel SELECT itemID FROM {} '
+				u'WHERE parentItemID IN sel'.format(table))
+		drop_trashed()
+
+		items = {}
+		order = []
+		for item_id, key, version, item_type, added, modified in db.execute(
+			u'SELECT i.itemID, i.key, i.version, t.typeName, i.dateAdded, '
+			u'i.dateModified FROM items i JOIN sel USING (itemID) '
+			u'JOIN {} t USING (itemTypeID) '
+			u'ORDER BY i.dateModified DESC'.format(types)):
+			items[item_id] = {u'key': key, u'version': version, 
+				u'itemType': item_type, u'creators': [], u'tags': [], 
+				u'collections': [], u'relations': {},
+				u'dateAdded': zotero_time(added), 
+				u'dateModified': zotero_time(modified)}
+			order.append(item_id)
+		for item_id, field, value in db.execute(
+			u'SELECT d.itemID, f.fieldName, v.value FROM itemData d '
+			u'JOIN sel USING (itemID) JOIN {} f USING (fieldID) '
+			u'JOIN itemDataValues v USING (valueID)'.format(fields)):
+			if field == u'date': # stored as u'YYYY-MM-DD original'
+				value = re.sub(ur'^\d{4}-\d{2}-\d{2} ', u'', value)
+			items[item_id][field] = value
+		for item_id, creator_type, first, last, mode in db.execute(
+			u'SELECT ic.itemID, ct.creatorType, c.firstName, c.lastName, '
+			u'c.fieldMode FROM itemCreators ic JOIN sel USING (itemID) '
+			u'JOIN creators c USING (creatorID) '
+			u'JOIN creatorTypes ct USING (creatorTypeID) '
+			u'ORDER BY ic.itemID, ic.orderIndex'):
+			creator = {u'creatorType': creator_type}
+			if mode == 1:
+				creator[u'name'] = last
+			else:
+				creator[u'firstName'] = first
+				creator[u'lastName'] = last
+			items[item_id][u'creators'].append(creator)
+		for item_id, name, tag_type in db.execute(
+			u'SELECT it.itemID, t.name, it.type FROM itemTags it '
+			u'JOIN sel USING (itemID) JOIN tags t USING (tagID)'):
+			tag = {u'tag': name}
+			if tag_type:
+				tag[u'type'] = tag_type
+			items[item_id][u'tags'].append(tag)
+		for item_id, key in db.execute(
+			u'SELECT ci.itemID, c.key FROM collectionItems ci '
+			u'JOIN sel USING (itemID) JOIN collections c USING (collectionID)'):
+			items[item_id][u'collections'].append(key)
+		for item_id, parent, mode, content_type, path in db.execute(
+			u'SELECT a.itemID, p.key, a.linkMode, a.contentType, a.path '
+			u'FROM itemAttachments a JOIN sel USING (itemID) '
+			u'LEFT JOIN items p ON p.itemID = a.parentItemID'):
+			item = items[item_id]
+			if parent:
+				item[u'parentItem'] = parent
+			item[u'linkMode'] = self.LINK_MODES.get(mode, mode)
+			item[u'contentType'] = content_type or u''
+			if path and path.startswith(u'storage:'):
+				item[u'filename'] = path[len(u'storage:'):]
+			elif path:
+				if path.startswith(u'attachments:') and self.base_dir:
+					path = os.path.join(
+						self.base_dir, path[len(u'attachments:'):])
+				item[u'path'] = path
+		for item_id, parent, note in db.execute(
+			u'SELECT n.itemID, p.key, n.note FROM itemNotes n '
+			u'JOIN sel USING (itemID) '
+			u'LEFT JOIN items p ON p.itemID = n.parentItemID'):
+			item = items[item_id]
+			if parent:
+				item[u'parentItem'] = parent
+			item[u'note'] = note or u''
+		return collections.OrderedDict(
+			(items[i][u'key'], items[i]) for i in order)
+
+	def write_items(self, *args, **kwargs):
+		raise ValueError(u'ZoteroSQLite is read-only, use Zotero to upload')
+
+	def upload_cleantexts(self, *args, **kwargs):
+		raise ValueError(u'ZoteroSQLite is read-only, use Zotero to upload')
+
+	def prepare_cleantexts(self, *args, **kwargs):
+		raise ValueError(u'ZoteroSQLite is read-only, use Zotero to upload')
+
+
+
+
 ### TopicModel class
 ###############################################################################
 class TopicModel(object):
@@ -1138,8 +3155,10 @@ class TopicModel(object):
 ###############################################################################
 class Corpus(textacy.Corpus):
 
-	def __init__(self, lang=u'en_core_web_sm', texts=None, docs=None, metadatas=None):
-		textacy.Corpus.__init__(self, lang=lang, texts=texts, docs=docs, metadatas=metadatas)
+	def __init__(self, lang=u'en_core_web_sm', texts=None, docs=None, metadatas=None,
+		disable=()):
+		textacy.Corpus.__init__(self, lang=load_model(lang, disable=disable), 
+			texts=texts, docs=docs, metadatas=metadatas)
 
 	def stopwords(self, case_sensitive=True):
 		if case_sensitive == True:
@@ -26,12 +26,21 @@
 from __future__ import division
 
 import re
+import gc
+import copy
 import ftfy
 import collections
 import itertools
+import os
 import types
+import multiprocessing
+import msgpack
+import spacy
+import numpy as np
+import scipy.sparse
 import textract
 import textacy
+import distance
 import unicodedata
 import subprocess
 from bs4 import BeautifulSoup
@@ -58,15 +67,326 @@ def sliding_window(seq, n=2):
 	return zip(*(collections.deque(itertools.islice(it, i), 0) or it
 		for i, it in enumerate(itertools.tee(seq, n))))
 
+def qgrams(string, q=3):
+	'''
+	Returns a Counter of all substrings of length q in string
+	'''
+	return collections.Counter(string[i:i+q] for i in range(len(string) - q + 1))
+
+def char_profile(string):
+	'''
+	Returns a Counter of the characters in string
+	'''
+	return collections.Counter(string)
+
+def levenshtein_within(seq1, seq2, max_dist):
+	'''
+	Returns the Levenshtein distance of seq1 and seq2 if it is at most 
+	max_dist, else None. Only the band of cells within max_dist of the 
+	diagonal is computed, and the computation stops as soon as the whole 
+	band exceeds max_dist.
+	'''
+	len1, len2 = len(seq1), len(seq2)
+	if abs(len1 - len2) > max_dist:
+		return None
+	if seq1 == seq2:
+		return 0
+	if not len1 or not len2:
+		return max(len1, len2)
+	big = max_dist + 1 # stands for anything beyond max_dist
+	prev = [j if j <= max_dist else big for j in range(len2 + 1)]
+	for i in range(1, len1 + 1):
+		cur = [big] * (len2 + 1)
+		cur[0] = i if i <= max_dist else big
+		char = seq1[i-1]
+		for j in range(max(1, i - max_dist), min(len2, i + max_dist) + 1):
+			cost = prev[j-1] + (char != seq2[j-1])
+			if prev[j] + 1 < cost:
+				cost = prev[j] + 1
+			if cur[j-1] + 1 < cost:
+				cost = cur[j-1] + 1
+			cur[j] = cost if cost < big else big
+		if min(cur) > max_dist:
+			return None
+		prev = cur
+	return prev[len2] if prev[len2] <= max_dist else None
+
+def nlevenshtein_within(seq1, seq2, nlev):
+	'''
+	Returns True if distance.nlevenshtein(seq1, seq2, method=2) <= nlev.
+
+	Method 2 divides the edit distance d by the length of the longest 
+	alignment, which lies between max(len1, len2) and min(len1, len2) + d. 
+	This bounds d, so a banded levenshtein_within suffices in most cases. 
+	The exact nlevenshtein is only computed if the bounds are inconclusive.
+	'''
+	if seq1 == seq2:
+		return 0.0 <= nlev
+	len1, len2 = len(seq1), len(seq2)
+	if not len1 or not len2:
+		return 1.0 <= nlev
+	shorter, longer = min(len1, len2), max(len1, len2)
+	if nlev >= 1:
+		max_dist = longer
+	else:
+		max_dist = int(nlev * shorter / (1 - nlev) + 1e-9)
+	d = levenshtein_within(seq1, seq2, max_dist)
+	if d is None:
+		return False
+	if d / float(longer) <= nlev:
+		return True
+	if d / float(shorter + d) > nlev:
+		return False
+	return distance.nlevenshtein(seq1, seq2, method=2) <= nlev
+
+def nlevenshtein_batch(seq, seqs, nlev, profile=None, profiles=None):
+	'''
+	Batched nlevenshtein_within: returns a list of booleans, one for each of 
+	seqs. Candidates are first checked against a cheap lower bound of the 
+	edit distance (the difference of the character profiles, see 
+	char_profile), which rejects most of them without any edit distance 
+	computation. Profiles can be passed in if they are cached already.
+	'''
+	profile = profile if profile is not None else char_profile(seq)
+	if profiles is None:
+		profiles = [char_profile(s) for s in seqs]
+	len1 = len(seq)
+	result = []
+	for other, other_profile in zip(seqs, profiles):
+		len2 = len(other)
+		if seq == other or not len1 or not len2 or nlev >= 1:
+			result.append(nlevenshtein_within(seq, other, nlev))
+			continue
+		max_dist = int(nlev * min(len1, len2) / (1 - nlev) + 1e-9)
+		if abs(len1 - len2) > max_dist or max(
+			sum((profile - other_profile).itervalues()),
+			sum((other_profile - profile).itervalues())) > max_dist:
+			result.append(False)
+			continue
+		result.append(nlevenshtein_within(seq, other, nlev))
+	return result
+
+def pair_keys(ids, width=4, directed=False):
+	'''
+	Returns the pairs (first, other) of every window of sliding_window(ids, 
+	width) as int64 keys first << 32 | other. For undirected pairs the 
+	smaller id comes first.
+	'''
+	ids = np.asarray(ids, dtype=np.int64)
+	n = len(ids) - width + 1
+	if n <= 0:
+		return np.zeros(0, dtype=np.int64)
+	first = np.tile(ids[:n], width - 1)
+	other = np.concatenate([ids[i:i+n] for i in range(1, width)])
+	if not directed:
+		first, other = np.minimum(first, other), np.maximum(first, other)
+	return (first << 32) | other
+
+def split_pair_key(key):
+	return int(key >> 32), int(key & 0xffffffff)
+
+def doc_pair_counts(terms, width=4, directed=False):
+	'''
+	Counts the window pairs of one document (list of terms) on ids local to 
+	the document. Returns (terms, keys, counts): the distinct terms by id, 
+	the distinct pair keys (see pair_keys) and their counts.
+	'''
+	vocab = {}
+	ids = [vocab.setdefault(t, len(vocab)) for t in terms]
+	keys, counts = np.unique(pair_keys(ids, width=width, directed=directed), 
+		return_counts=True)
+	return sorted(vocab, key=vocab.get), keys, counts
+
+_worker_state = {} # set in each worker process by _init_worker
+
+def _init_worker(state):
+	'''
+	Pool initializer: keeps state (passed on fork, not pickled) for the jobs
+	of this pool's worker processes only
+	'''
+	_worker_state.clear()
+	_worker_state.update(state)
+
+def _co_words_job(i):
+	label, doc = _worker_state[u'docs'][i]
+	return _co_words_count(label, doc, _worker_state[u'params'])
+
+def _co_words_count(label, doc, p):
+	if callable(doc):
+		doc = doc()
+	terms = [t.lemma_ if p[u'lemma'] else t.lower_ 
+		for t in textacy.extract.words(doc, **p[u'kwargs'])] if doc else []
+	return (label,) + doc_pair_counts(terms, width=p[u'width'], 
+		directed=p[u'directed'])
+
+def co_words_counts(docs, width=4, directed=False, lemma=True, n_jobs=1, 
+	**kwargs):
+	'''
+	Yields (label, terms, keys, counts) (see doc_pair_counts) for each 
+	(label, doc) in docs. Words are extracted with textacy.extract.words(doc,
+	**kwargs). doc may also be a function returning the doc (or None), so 
+	that docs can be parsed on demand. docs are consumed one by one unless 
+	workers are used.
+	- n_jobs = number of worker processes (-1 for all cpus). Workers are 
+	  forked and inherit docs, so only compact counts are sent back. Where 
+	  fork is not available (Windows), documents are processed serially.
+	'''
+	if n_jobs is not None and n_jobs < 0:
+		n_jobs = multiprocessing.cpu_count()
+	params = {u'width': width, u'directed': directed, u'lemma': lemma, 
+		u'kwargs': kwargs}
+	if not n_jobs or n_jobs == 1 or os.name == u'nt':
+		for label, doc in docs:
+			yield _co_words_count(label, doc, params)
+		return
+	docs = list(docs)
+	if len(docs) < 2:
+		for label, doc in docs:
+			yield _co_words_count(label, doc, params)
+		return
+	pool = multiprocessing.Pool(min(n_jobs, len(docs)), _init_worker, 
+		({u'docs': docs, u'params': params},))
+	try:
+		for result in pool.imap(_co_words_job, range(len(docs)), 
+			chunksize=max(1, len(docs) // (4 * n_jobs))):
+			yield result
+	finally:
+		pool.terminate()
+
+_models = {} # (model name, disabled components) -> spacy Language
+
+def load_model(lang=u'en_core_web_sm', disable=()):
+	'''
+	Returns the spacy model lang without the pipeline components in 
+	disable (e.g. (u'parser', u'ner') if only lemmas are needed). Each model
+	is loaded once per process; variants without some components share the
+	loaded model (vocab, tokenizer and remaining components).
+	- lang = name of a spacy model or a loaded spacy Language
+	'''
+	disable = tuple(sorted(disable or ()))
+	if isinstance(lang, spacy.language.Language):
+		nlp = lang
+	else:
+		if (lang, ()) not in _models:
+			_models[(lang, ())] = spacy.load(lang)
+		nlp = _models[(lang, ())]
+	if not disable:
+		return nlp
+	if (lang, disable) in _models:
+		return _models[(lang, disable)]
+	variant = copy.copy(nlp)
+	variant.pipeline = [(name, pipe) for name, pipe in nlp.pipeline 
+		if name not in disable]
+	if isinstance(lang, basestring):
+		_models[(lang, disable)] = variant
+	return variant
+
+def doc_nbytes(doc):
+	'''
+	Rough estimate of the memory used by a spacy Doc (tokens, text and 
+	tensor)
+	'''
+	return len(doc) * 200 + len(doc.text) * 4 + getattr(doc.tensor, u'nbytes', 0)
+
+def doc_to_bytes(doc):
+	'''
+	Serialises a spacy Doc (without user_data and tensor) together with the 
+	strings of its annotations, which Doc.to_bytes does not include 
+	(see doc_from_bytes)
+	'''
+	strings = set()
+	for t in doc:
+		strings.update((t.lemma_, t.tag_, t.dep_, t.ent_type_))
+	return msgpack.dumps({u'doc': doc.to_bytes(user_data=True, tensor=True), 
+		u'strings': sorted(strings)}, use_bin_type=True)
+
+def doc_from_bytes(vocab, data):
+	'''
+	Returns the spacy Doc serialised with doc_to_bytes, on vocab
+	'''
+	msg = msgpack.loads(data, raw=False)
+	for string in msg[u'strings']:
+		vocab.strings.add(string)
+	return spacy.tokens.Doc(vocab).from_bytes(msg[u'doc'])
+
+def _parse_job(chunk):
+	nlp, read = _worker_state[u'nlp'], _worker_state[u'read']
+	contents = (read(_worker_state[u'contents'][i]) for i in chunk)
+	return [doc_to_bytes(doc) for doc in nlp.pipe(contents, 
+		batch_size=_worker_state[u'batch_size'])]
+
+def parse_docs(contents, nlp, batch_size=50, n_process=1, read=None):
+	'''
+	Yields a spacy Doc for each of contents, in order, parsed in batches 
+	with nlp.pipe.
+	- read = function applied to each content before parsing (e.g. 
+	  read_text to parse files from their paths)
+	- n_process = number of worker processes (-1 for all cpus). Workers are 
+	  forked and each parses batch_size contents at a time; docs are sent 
+	  back with doc_to_bytes. Where fork is not available (Windows), 
+	  contents are parsed in this process.
+	'''
+	contents = list(contents)
+	read = read or (lambda content: content)
+	if n_process is not None and n_process < 0:
+		n_process = multiprocessing.cpu_count()
+	if not n_process or n_process == 1 or len(contents) <= batch_size or os.name == u'nt':
+		for doc in nlp.pipe((read(c) for c in contents), batch_size=batch_size):
+			yield doc
+		return
+	chunks = [range(i, min(i + batch_size, len(contents))) 
+		for i in range(0, len(contents), batch_size)]
+	pool = multiprocessing.Pool(min(n_process, len(chunks)), _init_worker, 
+		({u'nlp': nlp, u'read': read, u'contents': contents, 
+		u'batch_size': batch_size},))
+	try:
+		for docs in pool.imap(_parse_job, chunks):
+			for data in docs:
+				yield doc_from_bytes(nlp.vocab, data)
+	finally:
+		pool.terminate()
+
+def closing_generator(generator, close):
+	'''
+	Yields from generator and calls close() once it is exhausted or closed
+	'''
+	try:
+		for i in generator:
+			yield i
+	finally:
+		close()
+
 def clean_originals(which):
-	deadrefs = [i for i in which._originals if i() is None]
-	map(which._originals.discard, deadrefs)
+	which._registry.clean()
+
+def freeze(value):
+	'''
+	Returns a hashable version of value (dicts and sets become frozensets, 
+	lists become tuples), so that a.viewitems() <= b.viewitems() for two dicts 
+	a and b if and only if freeze(a) <= freeze(b).
+	'''
+	if isinstance(value, dict):
+		return frozenset((k, freeze(v)) for k, v in value.iteritems())
+	if isinstance(value, (list, tuple)):
+		return tuple(freeze(v) for v in value)
+	if isinstance(value, (set, frozenset)):
+		return frozenset(freeze(v) for v in value)
+	return value
 
 def write_list_to_lines(somelist, filename):
 	with open(filename, u'w') as file:
 		for i in somelist:
 			file.write(u''.join([i, u'\n']))
 
+def zotero_time(value):
+	'''
+	Converts a timestamp of the Zotero database (u'YYYY-MM-DD HH:MM:SS', UTC)
+	to the form used by the Zotero web API (u'YYYY-MM-DDTHH:MM:SSZ')
+	'''
+	if value and re.match(ur'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$', value):
+		return value.replace(u' ', u'T') + u'Z'
+	return value
+
 def part_of_seq(idx, seq, n=4):
 	'''
 	Divides a sequence in n parts and returns the part where element is in.
@@ -112,6 +432,122 @@ def co_occurrences(edgelist, focus=u'target'):
 			co_occurrences[pair].add(k)
 	return co_occurrences
 
+def incidence_matrix(edgelist, focus=u'target'):
+	'''
+	Returns (A, connectors, nodes), where A is a binary sparse matrix with a 
+	row for each connector and a column for each node (e.g. citing x cited 
+	texts for focus='target', or cited x citing texts for focus='source')
+	'''
+	if not isinstance(edgelist,(list,types.GeneratorType)):
+		raise ValueError(u'edgelist must be list or generator ' \
+			'and can only contain 2-tuples')
+	connectors, nodes = {}, {}
+	rows, cols = [], []
+	for e in edgelist:
+		if not (isinstance(e,tuple) and len(e) == 2):
+			raise ValueError(u'edgelist must be list or generator ' \
+			'and can only contain 2-tuples')
+		k,v = e[0], e[1]
+		if focus == u'source':
+			k,v = v,k
+		rows.append(connectors.setdefault(k, len(connectors)))
+		cols.append(nodes.setdefault(v, len(nodes)))
+	A = scipy.sparse.csr_matrix(
+		(np.ones(len(rows), dtype=np.int32), (rows, cols)), 
+		shape=(len(connectors), len(nodes)))
+	A.data[:] = 1 # duplicate edges are summed up by csr_matrix
+	connectors = sorted(connectors, key=connectors.get)
+	nodes = sorted(nodes, key=nodes.get)
+	return A, connectors, nodes
+
+def sparse_co_occurrences(edgelist, focus=u'target', connectors=True, 
+	min_weight=1, top_k_per_node=None, block_size=1000):
+	'''
+	Sparse-matrix version of co_occurrences. The co-occurrence counts are 
+	computed as A.T * A from the incidence matrix A, one block of 
+	block_size columns at a time. Each block is pruned right away, so memory
+	scales with the retained pairs rather than with all pairs.
+	- connectors: if True, returns a defaultdict like co_occurrences, which 
+	  maps each co_occurrence to a set of connectors. If False, returns a 
+	  weighted edge list [(node, node, count)] without building any sets.
+	- min_weight = only keep pairs with at least this many connectors
+	- top_k_per_node = if given, only keep pairs that are among the k 
+	  heaviest pairs of at least one of their nodes (ties are broken by 
+	  order of appearance in edgelist)
+	'''
+	A, conns, nodes = incidence_matrix(edgelist, focus=focus)
+	AT = A.T.tocsr()
+	A = A.tocsc()
+	n = A.shape[1]
+	found = [] # (i, j, count) arrays of the kept pairs of each block
+	for start in range(0, n, block_size):
+		block = AT.dot(A[:, start:start+block_size]).tocsc()
+		if top_k_per_node is None:
+			block = block.tocoo()
+			cols = block.col + start
+			mask = (block.row < cols) & (block.data >= min_weight)
+			found.append((block.row[mask], cols[mask], block.data[mask]))
+			continue
+		for b in range(block.shape[1]):
+			j = start + b
+			rows = block.indices[block.indptr[b]:block.indptr[b+1]]
+			weights = block.data[block.indptr[b]:block.indptr[b+1]]
+			mask = (rows != j) & (weights >= min_weight)
+			rows, weights = rows[mask], weights[mask]
+			if len(rows) > top_k_per_node:
+				top = np.lexsort((rows, -weights))[:top_k_per_node]
+				rows, weights = rows[top], weights[top]
+			found.append((np.minimum(rows, j), np.maximum(rows, j), weights))
+	I, J, W = [np.concatenate([f[k] for f in found]).astype(np.int64) 
+		if found else np.zeros(0, dtype=np.int64) for k in range(3)]
+	# pairs in order, each once (with top_k_per_node, a pair can be among 
+	# the heaviest of both of its nodes)
+	codes, first = np.unique(I * n + J, return_index=True)
+	I, J, W = I[first], J[first], W[first]
+	if not connectors:
+		return [(nodes[i], nodes[j], w) 
+			for i, j, w in itertools.izip(I.tolist(), J.tolist(), W.tolist())]
+	by_connector = A.tocsr()
+	by_connector.sort_indices()
+	degrees = np.diff(by_connector.indptr).astype(np.int64)
+	if (degrees * (degrees - 1) // 2).sum() <= 30 * len(codes):
+		# going through the node pairs of each connector is cheaper than 
+		# intersecting the connectors of each kept pair: all (pair, 
+		# connector) entries are enumerated at once and grouped by pair
+		ends = np.repeat(by_connector.indptr[1:], degrees).astype(np.int64)
+		after = ends - np.arange(len(by_connector.indices)) - 1
+		left = np.repeat(np.arange(len(after)), after)
+		right = left + 1 + np.arange(len(left)) - np.repeat(
+			np.cumsum(after) - after, after)
+		indices = by_connector.indices.astype(np.int64)
+		entries = indices[left] * n + indices[right]
+		ks = np.repeat(np.arange(len(degrees)), degrees)[left]
+		if min_weight > 1 or top_k_per_node is not None:
+			mask = np.in1d(entries, codes)
+			entries, ks = entries[mask], ks[mask]
+		order = np.argsort(entries, kind=u'mergesort')
+		grouped = [conns[k] for k in ks[order].tolist()]
+		bounds = (np.flatnonzero(np.diff(entries[order])) + 1).tolist()
+		starts = [0] + bounds if len(entries) else []
+		pairs = ((divmod(code, n), grouped[a:b]) for code, a, b in 
+			itertools.izip(entries[order][starts].tolist(), starts, 
+			bounds + [len(entries)]))
+	else:
+		pairs = (((i, j), (conns[k] for k in np.intersect1d(
+			A.indices[A.indptr[i]:A.indptr[i+1]], 
+			A.indices[A.indptr[j]:A.indptr[j+1]], assume_unique=True))) 
+			for i, j in itertools.izip(I.tolist(), J.tolist()))
+	co_occurrences = collections.defaultdict(set)
+	enabled = gc.isenabled()
+	gc.disable() # else collections triggered by the new sets take most time
+	try:
+		for (i, j), shared in pairs:
+			co_occurrences[(nodes[i], nodes[j])] = set(shared)
+	finally:
+		if enabled:
+			gc.enable()
+	return co_occurrences
+
 def read_text(path, read_method=u'textract'):
 	# Hier noch Formate unterscheiden! Slate zB nur PDF!!! 
 	if read_method == u'textract':
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+'''
+Times parsing the cleantexts of an Intertext: Text.refresh_doc text by text
+against Intertext.build_docs with several batch sizes and numbers of
+worker processes, and reports docs per second.
+
+usage: python scripts/bench_build_docs.py [number of texts] [spacy model]
+'''
+import gc
+import io
+import os
+import sys
+import time
+import shutil
+import random
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intertext import Text, Intertext
+from intertext.functions import load_model
+
+BATCH_SIZES = (10, 50, 200)
+N_PROCESSES = (1, 2, 4)
+
+
+def cleantexts(directory, n, words=500, seed=0):
+	'''
+	Writes n cleantexts of random sentences and returns their paths
+	'''
+	rand = random.Random(seed)
+	vocabulary = [u'word{}'.format(i) for i in range(5000)]
+	paths = []
+	for i in range(n):
+		path = os.path.join(directory, u'{}.txt'.format(i))
+		sentences = []
+		for _ in range(words // 10):
+			sentences.append(u' '.join(rand.choice(vocabulary)
+				for _ in range(10)).capitalize() + u'.')
+		with io.open(path, u'w', encoding=u'utf-8') as f:
+			f.write(u' '.join(sentences))
+		paths.append(path)
+	return paths
+
+
+def letters(n):
+	'''
+	Returns n spelled with letters (titles of copies would be merged)
+	'''
+	chars = []
+	for _ in range(4):
+		n, i = divmod(n, 26)
+		chars.append(u'abcdefghijklmnopqrstuvwxyz'[i])
+	return u''.join(reversed(chars))
+
+
+def report(label, n, seconds):
+	print u'{:<28}{:>8.1f}s{:>10.1f} docs/s'.format(label, seconds, n / seconds)
+
+
+def main(n=500, lang=u'en_core_web_sm'):
+	tmp = tempfile.mkdtemp()
+	try:
+		paths = cleantexts(tmp, n)
+		nlp = load_model(lang)
+		texts = [Text(title=u'Text {}'.format(letters(i)), date=u'2000',
+			cleantext_path=path) for i, path in enumerate(paths)]
+		intertext = Intertext(u'bench', texts)
+		print u'{} texts, model "{}"'.format(n, lang)
+		start = time.time()
+		for t in texts:
+			t.refresh_doc(t.cleantext, lang=nlp)
+		report(u'refresh_doc', n, time.time() - start)
+		for n_process in N_PROCESSES:
+			for batch_size in BATCH_SIZES:
+				start = time.time()
+				intertext.build_docs(batch_size=batch_size,
+					n_process=n_process, lang=nlp, refresh=True)
+				report(u'build_docs {:>3} x {}'.format(batch_size, n_process),
+					n, time.time() - start)
+		del intertext, texts, t
+		gc.collect()
+	finally:
+		shutil.rmtree(tmp)
+
+
+if __name__ == u'__main__':
+	main(*[int(a) if a.isdigit() else a for a in sys.argv[1:]])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Times the title comparison of one title against a population of titles:
+distance.nlevenshtein (as formerly used by Text.compares_to) against the
+banded nlevenshtein_within and the profile-filtered nlevenshtein_batch.
+
+usage: python scripts/bench_levenshtein.py [population size] [nlev]
+The pure python baseline needs a few ms per pair, hence the small default.
+'''
+import os
+import sys
+import time
+import random
+
+import distance
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intertext.functions import (nlevenshtein_within, nlevenshtein_batch,
+	char_profile)
+
+WORDS = (u'the of and in on a theory social science study history economic '
+	u'political analysis new approach knowledge network citation field '
+	u'sociology evidence method review change model practice research').split()
+
+
+def titles(n, seed=0):
+	rand = random.Random(seed)
+	return [u' '.join(rand.choice(WORDS) for _ in range(rand.randint(3, 12)))
+		for _ in range(n)]
+
+
+def variant(title, rand):
+	'''
+	Returns title with a few typos, as in a citation of it
+	'''
+	chars = list(title)
+	for _ in range(rand.randint(0, 3)):
+		chars[rand.randrange(len(chars))] = rand.choice(u'abcdefghij ')
+	return u''.join(chars)
+
+
+def timed(label, function, baseline=None):
+	start = time.time()
+	result = function()
+	seconds = time.time() - start
+	print u'{:<28}{:>9.3f}s{}'.format(label, seconds,
+		u'   x{:.1f}'.format(baseline / seconds) if baseline else u'')
+	return result, seconds
+
+
+def main(n=300, nlev=0.1):
+	rand = random.Random(1)
+	population = titles(n)
+	queries = [variant(rand.choice(population), rand) for _ in range(10)] + \
+		titles(10, seed=2)
+	print u'{} queries against {} titles, nlev={}'.format(
+		len(queries), n, nlev)
+	exact, base = timed(u'distance.nlevenshtein', lambda: [
+		[distance.nlevenshtein(q, t, method=2) <= nlev for t in population]
+		for q in queries])
+	within, _ = timed(u'nlevenshtein_within', lambda: [
+		[nlevenshtein_within(q, t, nlev) for t in population]
+		for q in queries], base)
+	batch, _ = timed(u'nlevenshtein_batch', lambda: [
+		nlevenshtein_batch(q, population, nlev) for q in queries], base)
+	profiles = [char_profile(t) for t in population]
+	cached, _ = timed(u'nlevenshtein_batch (cached)', lambda: [
+		nlevenshtein_batch(q, population, nlev, profiles=profiles)
+		for q in queries], base)
+	if not exact == within == batch == cached:
+		raise ValueError(u'Results differ from distance.nlevenshtein')
+	print u'{} matches, results identical'.format(sum(map(sum, exact)))
+
+
+if __name__ == u'__main__':
+	main(*[t(a) for t, a in zip((int, float), sys.argv[1:])])
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+'''
+Times the Actor registry for growing numbers of living actors: creating
+them (label assignment, is_copy), creating copies of existing ones,
+renaming and letting them die. The cost per actor should stay flat as the
+number of actors grows; with the former scans of all instances it grew
+linearly.
+
+usage: python scripts/bench_registry.py [largest number of actors]
+'''
+import gc
+import os
+import sys
+import time
+import random
+import string
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intertext import Actor
+
+
+def letters(n, width=5):
+	'''
+	Returns n spelled with letters (names must not contain digits)
+	'''
+	chars = []
+	for _ in range(width):
+		n, i = divmod(n, 26)
+		chars.append(string.ascii_lowercase[i])
+	return u''.join(reversed(chars)).capitalize()
+
+
+def names(n, seed=0):
+	rand = random.Random(seed)
+	# about a tenth of the names are shared by several actors
+	return [u'{}, {}'.format(letters(rand.randrange(max(1, n * 9 // 10))),
+		letters(i % 7, width=2)) for i in range(n)]
+
+
+def per_actor(seconds, n):
+	return u'{:>8.1f}us'.format(seconds / n * 1e6)
+
+
+def run(n):
+	all_names = names(n)
+	start = time.time()
+	actors = [Actor(name=name) for name in all_names]
+	created = time.time() - start
+	sample = random.Random(1).sample(actors, min(n, 10000))
+	start = time.time()
+	copies = [Actor(name=a.name) for a in sample]
+	copied = time.time() - start
+	if not all(c.is_copy for c in copies):
+		raise ValueError(u'Copies were not recognised')
+	start = time.time()
+	for a in sample:
+		a.name = a.name + u'x'
+	renamed = time.time() - start
+	del copies, sample, a # a leaks from the loops
+	start = time.time()
+	del actors
+	gc.collect()
+	dropped = time.time() - start
+	if len(Actor._registry):
+		raise ValueError(u'Dead actors are still registered')
+	if Actor._registry._free:
+		raise ValueError(u'Labels of dead actors are still counted')
+	print u'{:>9}{}{}{}{}'.format(n, per_actor(created, n),
+		per_actor(copied, min(n, 10000)), per_actor(renamed, min(n, 10000)),
+		per_actor(dropped, n))
+
+
+def main(largest=1000000):
+	print u'{:>9}{:>10}{:>10}{:>10}{:>10}'.format(
+		u'actors', u'create', u'copy', u'rename', u'drop')
+	n = 1000
+	while n <= largest:
+		run(n)
+		n *= 10
+
+
+if __name__ == u'__main__':
+	main(*[int(a) for a in sys.argv[1:]])
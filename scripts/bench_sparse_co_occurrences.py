@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+'''
+Times co-citation counting on a citation graph whose citation counts follow
+a power law (a few texts are cited by a large share of all citing texts)
+and measures its peak memory: co_occurrences (dict of sets) against
+sparse_co_occurrences with connectors, with all pairs counted and with
+pruning by min_weight and top_k_per_node. Each variant runs in a process
+of its own, which reports its peak RSS (ru_maxrss) and how far it rose
+above the RSS with just the edges loaded. Connector sets are only built up
+to 10000 citing texts: beyond that, they need several GB.
+
+usage: python scripts/bench_sparse_co_occurrences.py [largest number of
+citing texts] [references per citing text]
+'''
+import os
+import sys
+import time
+import random
+import resource
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intertext.functions import co_occurrences, sparse_co_occurrences
+
+VARIANTS = [
+	(u'dict', True, lambda e: co_occurrences(e)),
+	(u'sets', True, lambda e: sparse_co_occurrences(e)),
+	(u'counts', False, lambda e: sparse_co_occurrences(e, connectors=False)),
+	(u'pruned', False, lambda e: sparse_co_occurrences(e, connectors=False,
+		min_weight=2, top_k_per_node=10)),
+	]
+
+
+def power_law_edges(n_citing, refs, exponent=2.0, seed=0):
+	'''
+	Returns (citing, cited) edges: each citing text cites about refs texts,
+	drawn from n_citing texts with Zipf distributed popularity
+	'''
+	rand = np.random.RandomState(seed)
+	weights = 1.0 / np.arange(1, n_citing + 1) ** (exponent - 1)
+	weights /= weights.sum()
+	edges = []
+	for citing in range(n_citing):
+		k = max(1, rand.poisson(refs))
+		for cited in set(rand.choice(n_citing, size=k, p=weights)):
+			edges.append((u'c{}'.format(citing), u'r{}'.format(cited)))
+	random.Random(seed).shuffle(edges)
+	return edges
+
+
+def normalized(result):
+	'''
+	Merges pairs by their nodes (co_occurrences may key a pair in both
+	orders, depending on the order in which sets yield the cited texts)
+	'''
+	merged = {}
+	for pair, connectors in result.iteritems():
+		merged.setdefault(frozenset(pair), set()).update(connectors)
+	return merged
+
+
+def max_rss():
+	'''
+	Peak resident set size of this process in MB (ru_maxrss is in KB on
+	Linux, in bytes on macOS)
+	'''
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return rss / 2.0 ** (20 if sys.platform == u'darwin' else 10)
+
+
+def measure(name, n, refs):
+	'''
+	Runs one variant in this process and prints seconds, pairs, RSS with the
+	edges loaded and peak RSS
+	'''
+	edges = power_law_edges(n, refs)
+	function = dict((v[0], v[2]) for v in VARIANTS)[name]
+	loaded = max_rss()
+	start = time.time()
+	result = function(edges)
+	seconds = time.time() - start
+	print seconds, len(normalized(result) if name == u'dict' else result), \
+		loaded, max_rss()
+
+
+def run(n, refs, sets):
+	row = [n]
+	for name, with_sets, _ in VARIANTS:
+		if with_sets and not sets:
+			row += [None] * 3
+			continue
+		out = subprocess.check_output([sys.executable, os.path.abspath(
+			__file__), u'measure', name, str(n), str(refs)])
+		seconds, pairs, loaded, peak = out.split()
+		row += [float(seconds), int(pairs), float(peak) - float(loaded)]
+	print (u'{:>8}' + u'{:>9}{:>9}{:>8}' * len(VARIANTS)).format(*[
+		u'-' if v is None else u'{:.1f}'.format(v) if isinstance(v, float)
+		else v for v in row])
+
+
+def check(n, refs):
+	'''
+	Checks that the connector sets of both versions are the same
+	'''
+	edges = power_law_edges(n, refs)
+	if normalized(sparse_co_occurrences(edges)) != normalized(
+		co_occurrences(edges)):
+		raise ValueError(u'sparse_co_occurrences differs from co_occurrences')
+
+
+def main(largest=100000, refs=20, sets_up_to=10000):
+	check(1000, refs)
+	print u'seconds, pairs and MB above the RSS with the edges loaded'
+	print (u'{:>8}' + u'{:>26}' * len(VARIANTS)).format(u'',
+		*[v[0] for v in VARIANTS])
+	print (u'{:>8}' + u'{:>9}{:>9}{:>8}' * len(VARIANTS)).format(u'citing',
+		*[u's', u'pairs', u'MB'] * len(VARIANTS))
+	n = 1000
+	while n <= largest:
+		run(n, refs, n <= sets_up_to)
+		n *= 10
+
+
+if __name__ == u'__main__':
+	if sys.argv[1:2] == [u'measure']:
+		measure(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+	else:
+		main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+'''
+Times a full Zotero.refresh of a collection against the local stand-in API
+of the tests (tests/zotero_server.py) with simulated latency per request:
+pyzotero's everything() against _fetch_items with growing concurrency.
+
+usage: python scripts/bench_zotero_fetch.py [number of items] [latency s]
+'''
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, u'tests')]
+
+from intertext import Zotero
+from zotero_server import Library, start, stop
+
+
+def main(n=20000, latency=0.05):
+	lib = Library()
+	for i in range(n):
+		lib.put({u'itemType': u'book', u'title': u'Title {}'.format(i),
+			u'tags': [], u'collections': [u'C']})
+	server, endpoint = start(lib)
+	try:
+		z = Zotero(u'key', 1, u'user', collection_id=u'C', endpoint=endpoint)
+		order = [i[u'key'] for i in z.data]
+		lib.latency = latency
+		print u'{} items, {}s latency per request'.format(n, latency)
+		start_time = time.time()
+		items = z.web.everything(z.web.collection_items(u'C'))
+		seconds = time.time() - start_time
+		print u'{:<24}{:>7.1f}s'.format(u'pyzotero everything()', seconds)
+		if [i[u'key'] for i in items] != order:
+			raise ValueError(u'everything() gave another order')
+		for concurrency in (1, 4, 8, 16):
+			z.concurrency = concurrency
+			start_time = time.time()
+			z.refresh(full=True)
+			seconds = time.time() - start_time
+			print u'{:<24}{:>7.1f}s'.format(
+				u'concurrency {}'.format(concurrency), seconds)
+			if [i[u'key'] for i in z.data] != order:
+				raise ValueError(u'concurrency {} gave another order'.format(
+					concurrency))
+	finally:
+		stop(server)
+
+
+if __name__ == u'__main__':
+	main(*[t(a) for t, a in zip((int, float), sys.argv[1:])])
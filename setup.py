@@ -39,6 +39,10 @@ INSTALL_REQUIRES = [
     'pyzotero',
     'distance',
     'ftfy',
+    'numpy',
+    'scipy',
+    'msgpack>=0.5.2',
+    'requests',
 ]
 
 __dir__ = os.path.abspath(os.path.dirname(__file__))
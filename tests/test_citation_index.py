@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import gc
+import random
+import unittest
+
+from intertext import Text, Intertext
+
+
+class CitationIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		self.texts = [Text(title=u'Title {}'.format(name), date=u'2000')
+			for name in u'abcdefghij']
+		self.intertext = Intertext(u'x', self.texts[:6])
+
+	def tearDown(self):
+		del self.texts, self.intertext
+		gc.collect() # else the texts are the originals of the next test
+
+	def assertConsistent(self):
+		it = self.intertext
+		expected = {}
+		for citing, cited in it.iter_citations():
+			expected.setdefault(cited, set()).add(citing)
+		self.assertEqual(dict(it._cited_by), expected)
+		self.assertEqual(sorted(it.iter_cited_texts()), sorted(expected))
+		self.assertEqual(sorted(it.cited_texts), sorted(expected))
+		self.assertEqual(it.in_degrees,
+			dict((c, len(citers)) for c, citers in expected.iteritems()))
+		for t in self.texts:
+			self.assertEqual(it.in_degree(t), len(expected.get(t, ())))
+			self.assertEqual(sorted(it.cited_by(t)),
+				sorted(expected.get(t, ())))
+
+	def test_index_follows_changes(self):
+		rand = random.Random(0)
+		for _ in range(200):
+			action = rand.randrange(4)
+			t = rand.choice(self.texts)
+			if action == 0:
+				self.intertext.add_texts(t)
+			elif action == 1:
+				self.intertext.remove_texts(t)
+			elif action == 2:
+				t.add_citations_to(rand.sample(self.texts, 2))
+			else:
+				t.cites = rand.sample(self.texts, rand.randrange(3))
+			self.assertConsistent()
+
+	def test_cited_texts_can_change_while_iterating(self):
+		self.texts[0].add_citations_to(self.texts[1:3])
+		for cited in self.intertext.iter_cited_texts():
+			cited.add_citations_to(self.texts[3:5])
+		self.assertConsistent()
+
+
+if __name__ == u'__main__':
+	unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import gc
+import random
+import unittest
+
+from intertext import Text, Intertext
+from intertext.functions import co_occurrences, sparse_co_occurrences
+
+
+def edges(n_citing, n_cited, refs, seed=0):
+	rand = random.Random(seed)
+	result = []
+	for citing in range(n_citing):
+		# a few texts are cited by most citing texts
+		cited = set(int(n_cited ** rand.random()) for _ in range(refs))
+		result.extend((u'c{}'.format(citing), u'r{}'.format(c)) for c in cited)
+	return result
+
+
+def normalized(result):
+	'''
+	Merges pairs by their nodes (co_occurrences keys a pair in the order
+	the set of cited texts yields them)
+	'''
+	merged = {}
+	for pair, connectors in result.iteritems():
+		merged.setdefault(frozenset(pair), set()).update(connectors)
+	return merged
+
+
+class SparseCoOccurrencesTest(unittest.TestCase):
+
+	def test_connectors_equal_co_occurrences(self):
+		for focus in (u'target', u'source'):
+			e = edges(200, 300, 8)
+			expected = normalized(co_occurrences(e, focus=focus))
+			result = sparse_co_occurrences(e, focus=focus)
+			self.assertEqual(normalized(result), expected)
+			self.assertEqual(len(result), len(expected))
+			self.assertEqual(len(result[(u'none', u'such')]), 0) # defaultdict
+
+	def test_pruned_connectors_equal_co_occurrences(self):
+		e = edges(200, 300, 8)
+		expected = normalized(co_occurrences(e))
+		weights = sparse_co_occurrences(e, connectors=False, min_weight=3)
+		result = normalized(sparse_co_occurrences(e, min_weight=3))
+		self.assertEqual(result, dict((pair, connectors) for pair, connectors
+			in expected.iteritems() if len(connectors) >= 3))
+		self.assertEqual(sorted(len(c) for c in result.itervalues()),
+			sorted(w for _, _, w in weights))
+
+	def test_connectors_of_few_kept_pairs_are_intersected(self):
+		e = edges(300, 40, 30) # dense: many pairs per connector
+		expected = normalized(co_occurrences(e))
+		weights = sparse_co_occurrences(e, connectors=False, top_k_per_node=1)
+		result = sparse_co_occurrences(e, top_k_per_node=1)
+		self.assertEqual(sorted(result), sorted((u, v) for u, v, _ in weights))
+		for pair, connectors in result.iteritems():
+			self.assertEqual(connectors, expected[frozenset(pair)])
+
+	def test_keeps_garbage_collection_enabled(self):
+		sparse_co_occurrences(edges(20, 30, 4))
+		self.assertTrue(gc.isenabled())
+
+
+class CoCitationsTest(unittest.TestCase):
+
+	def tearDown(self):
+		gc.collect() # else the texts are the originals of the next test
+
+	def test_properties_equal_co_occurrences(self):
+		texts = dict((name, Text(title=u'Title {}'.format(name), date=u'2000'))
+			for name in u'abcdefgh')
+		for citing, cited in [(u'a', u'cde'), (u'b', u'cdf'), (u'c', u'df'),
+			(u'd', u'fgh'), (u'e', u'cdh')]:
+			texts[citing].add_citations_to([texts[c] for c in cited])
+		it = Intertext(u'x', texts.values())
+		citations = list(it.iter_citations())
+		self.assertEqual(normalized(it.co_citations),
+			normalized(co_occurrences(citations)))
+		self.assertEqual(normalized(it.bibliographic_coupling),
+			normalized(co_occurrences(citations, focus=u'source')))
+
+
+if __name__ == u'__main__':
+	unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import random
+import shutil
+import tempfile
+import unittest
+
+from intertext import CoWords, ApproxCoWords, SpilledCoWords
+
+
+def words(n, vocabulary=300, seed=0):
+	rand = random.Random(seed)
+	# Zipf-like: a few frequent words, many rare ones
+	return [u'w{}'.format(int(vocabulary ** rand.random())) for _ in range(n)]
+
+
+class RecordingCoWords(ApproxCoWords):
+
+	def prune(self):
+		self.peaks.append(len(self.freq))
+		ApproxCoWords.prune(self)
+
+
+class ApproxCoWordsTest(unittest.TestCase):
+
+	def test_prunes_within_a_document(self):
+		exact = CoWords(within_doc=True, connectors=False)
+		approx = RecordingCoWords(max_pairs=50, within_doc=True)
+		approx.peaks = []
+		terms = words(5000)
+		exact.add(u'doc', terms)
+		approx.add(u'doc', terms)
+		self.assertGreater(len(exact), 10 * approx.max_pairs)
+		self.assertGreater(len(approx.peaks), 1)
+		self.assertEqual(max(approx.peaks), 2 * approx.max_pairs + 1)
+		self.assertLessEqual(len(approx), 2 * approx.max_pairs)
+		self.assertGreater(approx.error, 0)
+		self.assertLessEqual(approx.error,
+			approx.total // (approx.max_pairs + 1))
+		true = dict((frozenset((u, v)), d[u'freq']) for u, v, d in exact.edges())
+		for u, v, data in approx.edges():
+			self.assertLessEqual(data[u'freq'], true[frozenset((u, v))])
+			self.assertGreaterEqual(data[u'freq'],
+				true[frozenset((u, v))] - approx.error)
+		reported = set(frozenset((u, v)) for u, v, _ in approx.edges())
+		for pair, freq in true.iteritems():
+			if freq >= 1 + approx.error:
+				self.assertIn(pair, reported)
+
+
+class CountingCoWords(SpilledCoWords):
+
+	def _merged(self, *args, **kwargs):
+		self.merges += 1
+		return SpilledCoWords._merged(self, *args, **kwargs)
+
+
+class SpilledCoWordsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def test_len_is_counted_on_merges(self):
+		exact = CoWords()
+		spilled = CountingCoWords(path=self.tmp, n_shards=4, buffer_size=100)
+		spilled.merges = 0
+		for i in range(5):
+			terms = words(300, seed=i)
+			exact.add(i, terms)
+			spilled.add(i, terms)
+		self.assertEqual(len(spilled), len(exact))
+		self.assertEqual(len(spilled), len(exact))
+		self.assertEqual(spilled.merges, 1)
+		terms = words(300, vocabulary=1000, seed=9)
+		exact.add(9, terms)
+		spilled.add(9, terms)
+		self.assertEqual(len(list(spilled.edges(min_freq=2))), 
+			len(list(exact.edges(min_freq=2))))
+		self.assertEqual(len(spilled), len(exact)) # counted by edges
+		self.assertEqual(spilled.merges, 2)
+		spilled.close()
+
+
+if __name__ == u'__main__':
+	unittest.main()
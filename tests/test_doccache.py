@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import spacy
+from spacy.tokens import Span
+
+from intertext import DocCache
+
+CONTENTS = [u'The quick brown fox jumps over the lazy dog number {}.'.format(i)
+	for i in u'abcdefgh']
+
+
+class DocCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, u'docs')
+		self.nlp = spacy.blank(u'en')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def annotated(self, content):
+		doc = self.nlp(content)
+		for t in doc:
+			t.tag_ = u'NN'
+			t.dep_ = u'dep'
+		doc.ents = [Span(doc, 1, 3, label=doc.vocab.strings.add(u'ANIMAL'))]
+		doc.is_tagged = doc.is_parsed = True # as set by a full pipeline
+		return doc
+
+	def test_saved_doc_loads_equal(self):
+		self.nlp.vocab.set_vector(u'fox', np.arange(4, dtype=np.float32))
+		doc = self.annotated(CONTENTS[0])
+		key = DocCache.key(doc.text, self.nlp)
+		DocCache(self.path).set(key, doc)
+		for vocab in (self.nlp.vocab, spacy.blank(u'en').vocab):
+			loaded = DocCache(self.path).get(key, vocab)
+			self.assertEqual([t.text for t in loaded], [t.text for t in doc])
+			self.assertEqual(
+				[(t.lemma_, t.tag_, t.dep_, t.ent_type_) for t in loaded],
+				[(t.lemma_, t.tag_, t.dep_, t.ent_type_) for t in doc])
+		loaded = DocCache(self.path).get(key, self.nlp.vocab)
+		self.assertEqual(loaded[3].vector.tolist(), doc[3].vector.tolist())
+
+	def test_changed_text_is_parsed_again(self):
+		cache = DocCache(self.path)
+		first = next(cache.parse_all([CONTENTS[0]], self.nlp))
+		changed = next(cache.parse_all([CONTENTS[0] + u' More.'], self.nlp))
+		self.assertEqual(changed.text, CONTENTS[0] + u' More.')
+		self.assertEqual(len(cache), 2)
+		self.assertNotEqual(DocCache.key(first.text, self.nlp),
+			DocCache.key(changed.text, self.nlp))
+
+	def test_size_cap_evicts_oldest(self):
+		cache = DocCache(self.path)
+		keys = [DocCache.key(c, self.nlp) for c in CONTENTS[:3]]
+		cache.set(keys[0], self.nlp(CONTENTS[0]))
+		cache.max_bytes = int(cache.size * 2.5)
+		cache.set(keys[1], self.nlp(CONTENTS[1]))
+		cache.get(keys[0], self.nlp.vocab) # now keys[1] is the oldest
+		cache.set(keys[2], self.nlp(CONTENTS[2]))
+		self.assertEqual(sorted(cache._entries), sorted([keys[0], keys[2]]))
+		self.assertEqual(sorted(os.listdir(self.path)),
+			sorted(k + u'.bin' for k in (keys[0], keys[2])))
+
+	def test_corrupt_file_is_parsed_again(self):
+		cache = DocCache(self.path)
+		list(cache.parse_all(CONTENTS[:2], self.nlp))
+		key = DocCache.key(CONTENTS[0], self.nlp)
+		with open(os.path.join(self.path, key + u'.bin'), u'wb') as f:
+			f.write(b'not a doc')
+		cache = DocCache(self.path)
+		docs = list(cache.parse_all(CONTENTS[:2], self.nlp))
+		self.assertEqual([d.text for d in docs], CONTENTS[:2])
+		self.assertEqual(cache.get(key, self.nlp.vocab).text, CONTENTS[0])
+
+	def test_contents_are_read_lazily(self):
+		cache = DocCache(self.path)
+		list(cache.parse_all(CONTENTS[:4], self.nlp))
+		read = []
+		def contents():
+			for c in CONTENTS:
+				read.append(c)
+				yield c
+		docs = cache.parse_all(contents(), self.nlp, batch_size=2)
+		self.assertEqual(next(docs).text, CONTENTS[0]) # a hit
+		self.assertEqual(len(read), 1)
+		self.assertEqual([next(docs).text for _ in range(4)], CONTENTS[1:5])
+		self.assertLessEqual(len(read), 6) # a window of two misses
+		self.assertEqual([d.text for d in docs], CONTENTS[5:])
+
+
+if __name__ == u'__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import gc
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import spacy
+
+from intertext import Text, Intertext, DocLRU
+from intertext.functions import doc_nbytes, read_text
+
+
+class BuildDocsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.nlp = spacy.blank(u'en')
+		self.texts = []
+		for i in range(6):
+			path = os.path.join(self.tmp, u'{}.txt'.format(i))
+			with io.open(path, u'w', encoding=u'utf-8') as f:
+				f.write(u'Some words of text number {}. '.format(i) * 20)
+			self.texts.append(Text(title=u'Text {}'.format(u'abcdef'[i]), 
+				date=u'2000', cleantext_path=path))
+		self.intertext = Intertext(u'x', self.texts)
+
+	def tearDown(self):
+		Text.doc_lru = None
+		del self.texts, self.intertext
+		gc.collect() # else the texts are the originals of the next test
+		shutil.rmtree(self.tmp)
+
+	def built(self):
+		return [t.has_doc for t in self.intertext.texts]
+
+	def test_builds_only_max_docs(self):
+		Text.doc_lru = DocLRU(max_docs=2)
+		self.assertEqual(self.intertext.build_docs(lang=self.nlp), 2)
+		self.assertEqual(sum(self.built()), 2)
+		self.assertEqual(len(Text.doc_lru), 2)
+
+	def test_stops_when_max_bytes_is_reached(self):
+		text = self.texts[0]
+		nbytes = doc_nbytes(self.nlp(read_text(text.cleantext_path)))
+		Text.doc_lru = DocLRU(max_bytes=3 * nbytes + nbytes // 2)
+		# the fourth doc drops the first, so building stops there
+		self.assertEqual(self.intertext.build_docs(lang=self.nlp), 4)
+		self.assertEqual(sum(self.built()), 3)
+
+	def test_builds_all_without_limit(self):
+		self.assertEqual(self.intertext.build_docs(lang=self.nlp), 6)
+		self.assertTrue(all(self.built()))
+
+
+if __name__ == u'__main__':
+	unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import spacy
+
+from intertext import Text, FeatureCache
+from intertext.functions import _models
+
+LOWER = dict(ngrams=(1,), normalize=u'lower')
+CONTENT = u'The quick brown fox jumps over the lazy dog. The dog sleeps.'
+
+
+class FeatureCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, u'text.txt')
+		with io.open(self.path, u'w', encoding=u'utf-8') as f:
+			f.write(CONTENT)
+		self.models = dict(_models)
+		Text.feature_cache = FeatureCache(os.path.join(self.tmp, u'features'))
+
+	def tearDown(self):
+		Text.feature_cache = None
+		_models.clear()
+		_models.update(self.models)
+		shutil.rmtree(self.tmp)
+
+	def text(self, title):
+		# a fresh model (and vocab) stands in for a new process
+		nlp = spacy.blank(u'en')
+		_models[(u'en_core_web_sm', ())] = nlp
+		return Text(title=title, date=u'2000', cleantext_path=self.path), nlp
+
+	def test_ids_resolve_in_fresh_vocab(self):
+		first, nlp = self.text(u'A')
+		strings = nlp.vocab.strings
+		bag = dict((strings[k], v) for k, v in first.bag_of_terms(**LOWER).items())
+		terms = [strings[i] for i in first.terms(**LOWER)]
+		second, nlp = self.text(u'B')
+		strings = nlp.vocab.strings
+		self.assertEqual(bag, dict(
+			(strings[k], v) for k, v in second.bag_of_terms(**LOWER).items()))
+		self.assertEqual(terms, [strings[i] for i in second.terms(**LOWER)])
+		self.assertFalse(second.has_doc) # served from disk
+
+	def test_unresolvable_ids_stay_in_memory(self):
+		first, nlp = self.text(u'A')
+		first.terms(ngrams=(1,)) # lemmas of a blank model have no strings
+		second, nlp = self.text(u'B')
+		list(second.terms(ngrams=(1,)))
+		self.assertTrue(second.has_doc) # not served from disk
+
+	def test_strings_roundtrip(self):
+		first, nlp = self.text(u'A')
+		bag = first.bag_of_terms(as_strings=True, **LOWER)
+		second, nlp = self.text(u'B')
+		self.assertEqual(second.bag_of_terms(as_strings=True, **LOWER), bag)
+		self.assertFalse(second.has_doc)
+
+
+if __name__ == '__main__':
+	unittest.main()
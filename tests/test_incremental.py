@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import spacy
+
+from intertext import Text, Intertext, IncrementalCoWords
+
+FILTERS = dict(filter_stops=True, filter_punct=True, filter_nums=True, 
+	include_pos=None, exclude_pos=None)
+
+
+def normalized(edges):
+	return sorted((tuple(sorted((u, v))), data[u'freq'], 
+		sorted(data[u'connectors'].items())) for u, v, data in edges)
+
+
+class IncrementalCoWordsTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		nlp = spacy.blank(u'en')
+		rand = random.Random(0)
+		words = [u''.join(rand.choice(u'abcdef') for _ in range(4)) 
+			for _ in range(200)]
+		cls.texts = []
+		for i in range(12):
+			t = Text(title=u'T{}'.format(i), date=u'2000')
+			t.refresh_doc(content=u' '.join(
+				rand.choice(words) for _ in range(300)), lang=nlp)
+			cls.texts.append(t)
+		cls.nlp = nlp
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def co_words(self, intertext, **kwargs):
+		return normalized(intertext.co_words(min_freq=2, connectors=True, 
+			output=u'list', **kwargs))
+
+	def test_matches_full_count_after_changes(self):
+		it = Intertext(u'x', self.texts[:8])
+		self.assertEqual(self.co_words(it, incremental=True), self.co_words(it))
+		it.add_texts(self.texts[8:])
+		it.remove_texts(self.texts[:2])
+		self.assertEqual(self.co_words(it, incremental=True), self.co_words(it))
+		self.texts[5].refresh_doc(content=u'alpha beta gamma delta ' * 10, 
+			lang=self.nlp)
+		self.assertEqual(self.co_words(it, incremental=True), self.co_words(it))
+
+	def test_cleantext_created_after_sync_is_counted(self):
+		t = Text(title=u'Later', date=u'2000')
+		it = Intertext(u'x', self.texts[:4] + [t])
+		def synced(): # one doc alone only counts within_doc
+			counted = self.co_words(it, incremental=True, within_doc=True)
+			self.assertEqual(counted, self.co_words(it, within_doc=True))
+			return set(w for pair, _, _ in counted for w in pair)
+		self.assertNotIn(u'beta', synced())
+		path = os.path.join(self.tmp, u'later.txt')
+		with open(path, u'w') as f:
+			f.write(b'alpha beta gamma delta ' * 10)
+		t.cleantext_path = path
+		t.prefetch_doc(lang=self.nlp)
+		self.assertIn(u'beta', synced())
+		with open(path, u'w') as f:
+			f.write(b'epsilon zeta eta theta ' * 10)
+		t.cleantext_path = path # rewritten in place
+		t.prefetch_doc(lang=self.nlp)
+		self.assertEqual(synced() & set([u'beta', u'zeta']), set([u'zeta']))
+
+	def test_saved_state_roundtrip(self):
+		it = Intertext(u'x', self.texts)
+		path = os.path.join(self.tmp, u'state.npz')
+		it.co_words_state(**FILTERS).save(path)
+		it2 = Intertext(u'y', self.texts)
+		state = IncrementalCoWords.load(path)
+		self.assertEqual(state.sync(it2.texts), 0) # nothing recounted
+		it2.co_words_state(state=state, **FILTERS)
+		self.assertEqual(self.co_words(it2, incremental=True), self.co_words(it))
+
+	def test_saved_state_with_other_parameters_is_rejected(self):
+		it = Intertext(u'x', self.texts)
+		path = os.path.join(self.tmp, u'state.npz')
+		it.co_words_state(lemma=False, **FILTERS).save(path)
+		state = IncrementalCoWords.load(path)
+		with self.assertRaises(ValueError):
+			it.co_words_state(lemma=True, state=state, **FILTERS)
+		with self.assertRaises(ValueError):
+			it.co_words_state(lemma=False, state=state, 
+				**dict(FILTERS, filter_stops=False))
+		it.co_words_state(lemma=False, state=state, **FILTERS)
+
+	def test_incremental_rejects_approximate_and_spill_dir(self):
+		it = Intertext(u'x', self.texts)
+		with self.assertRaises(ValueError):
+			it.co_words(incremental=True, approximate=True, output=u'list')
+		with self.assertRaises(ValueError):
+			it.co_words(incremental=True, spill_dir=self.tmp, output=u'list')
+
+
+if __name__ == '__main__':
+	unittest.main()
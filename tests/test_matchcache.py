@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from intertext import Text, MatchIndex, MatchCache
+
+PARAMS = dict(nlev=0.1, date_span=(4, 4))
+
+
+def text(title, date, key):
+	return Text(title=title, date=date, key=key)
+
+
+class MatchCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp, u'matches.json')
+		self.a = text(u'The archaeology of knowledge', u'1969', u'KA')
+		self.b = text(u'Discipline and punish', u'1975', u'KB')
+		self.c = text(u'The order of things', u'1966', u'KC')
+		self.population = [self.a, self.b, self.c]
+		self.hit = {u'title': u'The archaeology of knowledge', 
+			u'date': u'1969', u'authors': []}
+		self.miss = {u'title': u'Madness and civilization', 
+			u'date': u'1961', u'authors': []}
+		cache = MatchCache(self.path)
+		cache.validate(self.population)
+		index = MatchIndex(self.population, **PARAMS)
+		for citation in (self.hit, self.miss):
+			t = Text(**dict(citation))
+			candidates = index.candidates(t)
+			matches, level = index.best_matches(t)
+			cache.set(citation, matches[0] if matches else None, level, 
+				candidates, t, **PARAMS)
+		cache.save()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def cached(self, population):
+		cache = MatchCache(self.path)
+		cache.validate(population)
+		return cache.get(self.hit, **PARAMS), cache.get(self.miss, **PARAMS)
+
+	def test_unchanged_population_keeps_all(self):
+		hit, miss = self.cached(self.population)
+		self.assertEqual(hit[0], MatchCache.reference(self.a))
+		self.assertEqual(miss, [None, None])
+
+	def test_unrelated_addition_keeps_matches(self):
+		other = text(u'The birth of the clinic', u'1963', u'KD')
+		hit, miss = self.cached(self.population + [other])
+		self.assertEqual(hit[0], MatchCache.reference(self.a))
+		self.assertIsNone(miss) # negative entries are dropped
+
+	def test_addition_among_candidates_drops_match(self):
+		similar = text(u'The archaeology of knowledge', u'1970', u'KE')
+		hit, miss = self.cached(self.population + [similar])
+		self.assertIsNone(hit)
+
+	def test_removal_outside_candidates_keeps_match(self):
+		hit, miss = self.cached([self.a, self.c])
+		self.assertEqual(hit[0], MatchCache.reference(self.a))
+
+	def test_changed_candidate_drops_match(self):
+		changed = text(u'The archaeology of knowledge', u'1969', u'KX')
+		hit, miss = self.cached([changed, self.b, self.c])
+		self.assertIsNone(hit)
+
+	def test_old_format_is_cleared(self):
+		with open(self.path, u'w') as f:
+			json.dump({u'signature': u'x', u'entries': {u'k': [None, None]}}, f)
+		cache = MatchCache(self.path)
+		cache.validate(self.population)
+		self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from intertext import Text, MatchIndex
+
+
+class MatchIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		self.population = [
+			Text(title=u'The archaeology of knowledge', date=u'1969', key=u'KA'),
+			Text(title=u'The archeology of knowledge', date=u'1971', key=u'KB'),
+			Text(title=u'Discipline and punish', date=u'1975', key=u'KC')]
+		self.citation = Text(title=u'The archaeology of knowledge', 
+			date=u'1970')
+
+	def test_same_results_as_full_population(self):
+		for nlev, date_span in ((0.1, (4, 4)), (0.2, (1, 1)), (0.05, (0, 0))):
+			index = MatchIndex(self.population, nlev=nlev, date_span=date_span)
+			self.assertEqual(
+				self.citation.best_matches_in(index, nlev=nlev, 
+					date_span=date_span),
+				self.citation.best_matches_in(self.population, nlev=nlev, 
+					date_span=date_span))
+
+	def test_other_settings_than_the_index_are_rejected(self):
+		index = MatchIndex(self.population, nlev=0.2, date_span=(1, 1))
+		with self.assertRaises(ValueError):
+			self.citation.best_matches_in(index)
+		with self.assertRaises(ValueError):
+			self.citation.best_matches_in(index, nlev=0.2)
+		with self.assertRaises(ValueError):
+			self.citation.best_matches_in(index, nlev=0.1, date_span=(1, 1))
+		self.assertIsNotNone(self.citation.best_matches_in(index, nlev=0.2, 
+			date_span=[1, 1])[0])
+
+
+if __name__ == u'__main__':
+	unittest.main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import gc
+import random
+import unittest
+
+from intertext import Actor, Text
+
+
+class RegistryTest(unittest.TestCase):
+
+	def tearDown(self):
+		gc.collect() # else the actors are the originals of the next test
+
+	def test_star_counters_of_dead_bases_are_dropped(self):
+		registry = Actor._registry
+		rand = random.Random(0)
+		names = [u'Registry, {}'.format(n) for n in (u'Ann', u'Bob', u'Eve')]
+		actors = []
+		for _ in range(300):
+			if actors and rand.random() < 0.5:
+				actors.pop(rand.randrange(len(actors)))
+			else:
+				actors.append(Actor(name=rand.choice(names),
+					role=rand.random())) # alike actors would be copies
+			gc.collect()
+			live = set(a.label.rstrip(u'*') for a in actors)
+			self.assertLessEqual(set(b for b in registry._free
+				if b.startswith(u'Registry')), live)
+			self.assertEqual(len(set(a.label for a in actors)), len(actors))
+		del actors[:]
+		gc.collect()
+		self.assertFalse([b for b in registry._free
+			if b.startswith(u'Registry')])
+		self.assertEqual(Actor(name=names[0]).label, names[0])
+
+	def test_reassigned_attr_is_reindexed(self):
+		a = Text(title=u'Registry', date=u'2000')
+		a.attr = dict(a.attr, key=u'K1')
+		b = Text(title=u'Registry', date=u'2000', key=u'K1')
+		self.assertTrue(b.is_copy)
+		self.assertIs(b._original, a)
+		del b
+		gc.collect()
+		a.attr = {}
+		c = Text(title=u'Registry', date=u'2000', key=u'K1')
+		self.assertFalse(c.is_copy)
+		attr = {u'key': u'K2'}
+		a.attr = attr
+		attr[u'key'] = u'K1' # a keeps its own copy
+		self.assertEqual(a.attr, {u'key': u'K2'})
+		with self.assertRaises(ValueError):
+			a.attr = [(u'key', u'K3')]
+		del a, c
+
+
+if __name__ == u'__main__':
+	unittest.main()
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import spacy
+
+from intertext.functions import parse_docs, co_words_counts
+
+
+@unittest.skipIf(os.name == u'nt', u'workers need fork')
+class WorkersTest(unittest.TestCase):
+
+	def test_interleaved_pools_keep_their_state(self):
+		nlp = spacy.blank(u'en')
+		texts = [u'w{} alpha beta gamma delta'.format(i) for i in range(40)]
+		docs = [(i, nlp(t)) for i, t in enumerate(texts)]
+		parsed = parse_docs(texts, nlp, batch_size=5, n_process=2)
+		first = next(parsed)
+		counts = list(co_words_counts(docs, n_jobs=2)) # finishes first
+		self.assertEqual([first.text] + [d.text for d in parsed], texts)
+		self.assertEqual([c[0] for c in counts], range(40))
+		for count, serial in zip(counts, co_words_counts(docs, n_jobs=1)):
+			self.assertEqual(count[1], serial[1])
+			self.assertEqual(count[2].tolist(), serial[2].tolist())
+			self.assertEqual(count[3].tolist(), serial[3].tolist())
+
+
+if __name__ == u'__main__':
+	unittest.main()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import requests
+
+from intertext import Zotero
+
+from zotero_server import Library, start, stop
+
+
+class ZoteroTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.lib = Library()
+		self.server, self.endpoint = start(self.lib)
+		self.old_delay = Zotero.RETRY_DELAY
+		Zotero.RETRY_DELAY = 0.01
+
+	def tearDown(self):
+		Zotero.RETRY_DELAY = self.old_delay
+		stop(self.server)
+		shutil.rmtree(self.tmp)
+
+	def book(self, title, collection=u'C'):
+		return self.lib.put({u'itemType': u'book', u'title': title,
+			u'tags': [], u'collections': [collection]})
+
+	def zotero(self, **kwargs):
+		return Zotero(u'key', 1, u'user', collection_id=u'C',
+			endpoint=self.endpoint, **kwargs)
+
+	def notes(self, n):
+		return [{u'itemType': u'note', u'note': u'n{}'.format(i), u'tags': [],
+			u'collections': [u'C']} for i in range(n)]
+
+	def posts(self):
+		return [r for r in self.lib.requests if r[0] == 'POST']
+
+	def pages(self):
+		return [r[2] for r in self.lib.requests
+			if r[0] == 'GET' and r[1].endswith('/collections/C/items')
+			and r[2].get('format') == 'json']
+
+	def test_fetches_all_pages_in_order(self):
+		for i in range(250):
+			self.book(u'Title {}'.format(i))
+		self.book(u'Elsewhere', collection=u'D')
+		self.lib.latency = 0.02
+		z = self.zotero(concurrency=3)
+		self.assertEqual([i[u'key'] for i in z.texts], 
+			[i['key'] for i in self.lib.listing(u'C')])
+		self.assertEqual(sorted(int(p.get('start', 0)) for p in self.pages()),
+			[0, 100, 200])
+
+	def test_fetches_pages_concurrently(self):
+		for i in range(450):
+			self.book(u'Title {}'.format(i))
+		self.lib.latency = 0.05
+		z = self.zotero(concurrency=1)
+		start = time.time()
+		z.refresh(full=True)
+		serial = time.time() - start
+		self.assertEqual(self.lib.max_in_flight, 1)
+		z.concurrency = 3
+		start = time.time()
+		z.refresh(full=True)
+		concurrent = time.time() - start
+		self.assertEqual(self.lib.max_in_flight, 3) # 4 pages after the first
+		self.assertLess(concurrent, serial)
+		self.assertEqual([i[u'key'] for i in z.texts], 
+			[i['key'] for i in self.lib.listing(u'C')])
+
+	def test_refresh_fetches_only_changes(self):
+		keys = [self.book(u'Title {}'.format(i)) for i in range(30)]
+		cache = os.path.join(self.tmp, u'cache.json')
+		z = self.zotero(cache_path=cache)
+		self.lib.delete(keys[0])
+		self.lib.put(dict(self.lib.items[keys[1]], title=u'Changed'))
+		new = self.book(u'New')
+		del self.lib.requests[:]
+		z.refresh()
+		self.assertEqual([p.get('since') for p in self.pages()], ['30'])
+		self.assertEqual(sorted(i[u'key'] for i in z.texts),
+			sorted(keys[1:] + [new]))
+		self.assertEqual(z.item_by_key(keys[1])[u'title'], u'Changed')
+		del self.lib.requests[:]
+		z.refresh() # unchanged library
+		self.assertEqual(self.pages(), [])
+		z2 = self.zotero(cache_path=cache) # synced from the cache
+		self.assertEqual(self.pages(), [])
+		self.assertEqual(z2.data, z.data)
+
+	def test_refetches_if_library_changes(self):
+		for i in range(150):
+			self.book(u'Title {}'.format(i))
+		z = self.zotero()
+		changes = [1]
+		def change():
+			if changes:
+				changes.pop()
+				self.book(u'Added while fetching')
+		self.lib.on_page = change
+		z.refresh(full=True)
+		self.assertEqual(len(z.texts), 151)
+		self.lib.on_page = lambda: self.book(u'Added while fetching')
+		with self.assertRaises(ValueError):
+			z.refresh(full=True)
+
+	def test_duplicate_tags_are_indexed_once(self):
+		parent = self.book(u'Title')
+		tag = {u'tag': u'RDA cleantext'}
+		self.lib.put({u'itemType': u'attachment', u'parentItem': parent,
+			u'path': u'/clean.txt', u'tags': [tag, dict(tag)],
+			u'collections': [u'C']})
+		z = self.zotero()
+		self.assertEqual(z.cleantext_by_key(parent)[u'path'], u'/clean.txt')
+
+	def test_views_are_copies(self):
+		self.book(u'Title')
+		z = self.zotero()
+		z.texts.append({})
+		del z.attachments[:]
+		self.assertEqual(len(z.texts), 1)
+
+	def test_sessions_are_not_shared_between_threads(self):
+		z = self.zotero()
+		sessions = []
+		thread = threading.Thread(target=lambda: sessions.append(z.session()))
+		thread.start()
+		thread.join()
+		self.assertIs(z.session(), z.session())
+		self.assertIsNot(sessions[0], z.session())
+
+	def test_write_items_in_batches(self):
+		z = self.zotero()
+		keys = z.write_items(self.notes(120))
+		self.assertEqual([r[2] for r in self.posts()], [50, 50, 20])
+		self.assertEqual(sorted(keys), sorted(self.lib.items))
+
+	def test_write_items_retries_rate_limits(self):
+		z = self.zotero()
+		self.lib.fail_next = [429, 503]
+		keys = z.write_items(self.notes(3))
+		self.assertEqual(len(self.posts()), 3)
+		self.assertEqual(len(self.lib.items), 3)
+		self.assertNotIn(None, keys)
+
+	def test_checkpoint_skips_written_items(self):
+		z = self.zotero()
+		checkpoint = os.path.join(self.tmp, u'checkpoint.json')
+		items = self.notes(120)
+		self.lib.fail_next = [None, 500] # second batch fails
+		with self.assertRaises(requests.exceptions.HTTPError):
+			z.write_items(items, checkpoint=checkpoint)
+		self.assertEqual(len(self.lib.items), 50)
+		keys = z.write_items(items, checkpoint=checkpoint)
+		self.assertEqual([r[2] for r in self.posts()], [50, 50, 50, 20])
+		self.assertEqual(len(self.lib.items), 120)
+		self.assertEqual(sorted(keys), sorted(self.lib.items))
+		self.assertEqual(z.write_items(items, checkpoint=checkpoint), keys)
+		self.assertEqual(len(self.posts()), 4)
+
+	def test_lost_response_is_not_written_twice(self):
+		z = self.zotero()
+		checkpoint = os.path.join(self.tmp, u'checkpoint.json')
+		items = self.notes(60)
+		self.lib.drop_next = 1 # first batch written, answer lost, retry 412
+		keys = z.write_items(items, checkpoint=checkpoint)
+		self.assertEqual(len(self.lib.items), 60)
+		self.assertEqual(keys.count(None), 50)
+		with open(checkpoint) as f:
+			state = json.load(f)
+		self.assertEqual(len(state[u'keys']), 10)
+		self.assertNotIn(None, state[u'keys'].values())
+		self.assertEqual(len(state[u'unknown']), 50)
+		z.write_items(items, checkpoint=checkpoint)
+		self.assertEqual(len(self.lib.items), 60)
+
+
+if __name__ == u'__main__':
+	unittest.main()
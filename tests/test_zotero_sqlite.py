@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from intertext import Intertext, ZoteroSQLite
+
+SCHEMA = u'''
+CREATE TABLE libraries (libraryID INTEGER PRIMARY KEY, type TEXT NOT NULL,
+	version INT NOT NULL DEFAULT 0);
+CREATE TABLE groups (groupID INTEGER PRIMARY KEY, libraryID INT NOT NULL);
+CREATE TABLE itemTypes (itemTypeID INTEGER PRIMARY KEY, typeName TEXT);
+CREATE TABLE fields (fieldID INTEGER PRIMARY KEY, fieldName TEXT);
+CREATE TABLE items (itemID INTEGER PRIMARY KEY, itemTypeID INT NOT NULL,
+	dateAdded TIMESTAMP, dateModified TIMESTAMP, libraryID INT NOT NULL,
+	key TEXT NOT NULL, version INT NOT NULL DEFAULT 0);
+CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value UNIQUE);
+CREATE TABLE itemData (itemID INT, fieldID INT, valueID);
+CREATE TABLE creators (creatorID INTEGER PRIMARY KEY, firstName TEXT,
+	lastName TEXT, fieldMode INT);
+CREATE TABLE creatorTypes (creatorTypeID INTEGER PRIMARY KEY,
+	creatorType TEXT);
+CREATE TABLE itemCreators (itemID INT NOT NULL, creatorID INT NOT NULL,
+	creatorTypeID INT NOT NULL, orderIndex INT NOT NULL);
+CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE itemTags (itemID INT NOT NULL, tagID INT NOT NULL,
+	type INT NOT NULL);
+CREATE TABLE collections (collectionID INTEGER PRIMARY KEY,
+	collectionName TEXT NOT NULL, libraryID INT NOT NULL, key TEXT NOT NULL);
+CREATE TABLE collectionItems (collectionID INT NOT NULL, itemID INT NOT NULL);
+CREATE TABLE itemAttachments (itemID INTEGER PRIMARY KEY, parentItemID INT,
+	linkMode INT, contentType TEXT, path TEXT);
+CREATE TABLE itemNotes (itemID INTEGER PRIMARY KEY, parentItemID INT,
+	note TEXT);
+CREATE TABLE deletedItems (itemID INTEGER PRIMARY KEY);
+'''
+
+TYPES = {u'book': 1, u'journalArticle': 2, u'attachment': 3, u'note': 4}
+FIELDS = {u'title': 1, u'date': 2, u'publicationTitle': 3}
+
+
+class Database(object):
+	'''
+	Writes a zotero.sqlite with the tables (and columns) ZoteroSQLite reads
+	'''
+
+	def __init__(self, path):
+		self.db = sqlite3.connect(path)
+		self.db.executescript(SCHEMA)
+		self.db.execute(u"INSERT INTO libraries VALUES (1, 'user', 42)")
+		self.db.execute(u"INSERT INTO libraries VALUES (2, 'group', 7)")
+		self.db.execute(u'INSERT INTO groups VALUES (555, 2)')
+		for name, i in TYPES.items():
+			self.db.execute(u'INSERT INTO itemTypes VALUES (?, ?)', (i, name))
+		for name, i in FIELDS.items():
+			self.db.execute(u'INSERT INTO fields VALUES (?, ?)', (i, name))
+		for i, name in enumerate([u'author', u'editor']):
+			self.db.execute(u'INSERT INTO creatorTypes VALUES (?, ?)',
+				(i + 1, name))
+		# the same collection key in both libraries
+		self.db.execute(u"INSERT INTO collections VALUES (1, 'C', 1, 'COLL')")
+		self.db.execute(u"INSERT INTO collections VALUES (2, 'C', 2, 'COLL')")
+		self.n = 0
+
+	def insert(self, table, *values):
+		self.db.execute(u'INSERT INTO {} VALUES ({})'.format(
+			table, u', '.join(u'?' * len(values))), values)
+		return self.db.execute(u'SELECT last_insert_rowid()').fetchone()[0]
+
+	def item(self, item_type, library=1, collection=None, tags=(), **data):
+		self.n += 1
+		item_id = self.insert(u'items', None, TYPES[item_type],
+			u'2018-01-01 10:00:00', u'2018-02-01 10:00:{:02d}'.format(self.n),
+			library, u'K{:07d}'.format(self.n), self.n)
+		for field, value in data.items():
+			row = self.db.execute(u'SELECT valueID FROM itemDataValues '
+				u'WHERE value = ?', (value,)).fetchone()
+			value_id = row[0] if row else self.insert(
+				u'itemDataValues', None, value)
+			self.insert(u'itemData', item_id, FIELDS[field], value_id)
+		if collection:
+			self.insert(u'collectionItems', collection, item_id)
+		for tag in tags:
+			row = self.db.execute(u'SELECT tagID FROM tags WHERE name = ?',
+				(tag,)).fetchone()
+			self.insert(u'itemTags', item_id,
+				row[0] if row else self.insert(u'tags', None, tag), 0)
+		return item_id, u'K{:07d}'.format(self.n)
+
+	def creator(self, item_id, creator_type, first, last, index):
+		creator_id = self.insert(u'creators', None, first, last, 0)
+		self.insert(u'itemCreators', item_id, creator_id, creator_type, index)
+
+	def attachment(self, parent, path, tag, content_type=u'text/plain'):
+		item_id, key = self.item(u'attachment', tags=[tag])
+		self.insert(u'itemAttachments', item_id, parent, 2, content_type, path)
+		return key
+
+	def close(self):
+		self.db.commit()
+		self.db.close()
+
+
+class ZoteroSQLiteTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.storage = os.path.join(self.tmp, u'storage')
+		os.mkdir(self.storage)
+		self.path = os.path.join(self.tmp, u'zotero.sqlite')
+		db = Database(self.path)
+		self.book, self.book_key = db.item(u'book', collection=1,
+			title=u'The archaeology of knowledge', date=u'1969-00-00 1969')
+		db.creator(self.book, 1, u'Michel', u'Foucault', 0)
+		db.creator(self.book, 2, u'Ann', u'Editor', 1)
+		self.article, self.article_key = db.item(u'journalArticle',
+			collection=1, title=u'What is an author', date=u'1979-00-00 1979',
+			publicationTitle=u'Textual strategies')
+		db.creator(self.article, 1, u'Michel', u'Foucault', 0)
+		trashed, self.trashed_key = db.item(u'book', collection=1,
+			title=u'In the trash')
+		db.insert(u'deletedItems', trashed)
+		db.attachment(trashed, u'/trashed.txt', u'RDA cleantext')
+		self.group_key = db.item(u'book', library=2, collection=2,
+			title=u'In a group')[1]
+		db.attachment(self.book, u'/raw.pdf', u'RDA rawtext',
+			content_type=u'application/pdf')
+		self.cleantext_key = db.attachment(self.book,
+			u'attachments:clean.txt', u'RDA cleantext')
+		self.citations = os.path.join(self.tmp, u'citations.txt')
+		with open(self.citations, u'w') as f:
+			f.write(u'Foucault, Michel\n1979\nWhat is an author\n'.encode(u'utf-8'))
+		db.attachment(self.article, self.citations, u'RDA citations')
+		trashed_attachment = db.attachment(self.article, u'/gone.txt',
+			u'RDA rawtext')
+		db.insert(u'deletedItems', db.db.execute(u'SELECT itemID FROM items '
+			u'WHERE key = ?', (trashed_attachment,)).fetchone()[0])
+		db.close()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def zotero(self, **kwargs):
+		kwargs.setdefault(u'base_dir', self.storage)
+		return ZoteroSQLite(self.path, collection_id=u'COLL', **kwargs)
+
+	def test_reads_texts_of_the_collection(self):
+		z = self.zotero()
+		self.assertEqual(z.version, 42)
+		self.assertEqual([i[u'key'] for i in z.texts],
+			[self.article_key, self.book_key]) # latest modified first
+		book = z.item_by_key(self.book_key)
+		self.assertEqual(book[u'itemType'], u'book')
+		self.assertEqual(book[u'title'], u'The archaeology of knowledge')
+		self.assertEqual(book[u'date'], u'1969')
+		self.assertEqual(book[u'collections'], [u'COLL'])
+		self.assertEqual(book[u'creators'], [
+			{u'creatorType': u'author', u'firstName': u'Michel',
+				u'lastName': u'Foucault'},
+			{u'creatorType': u'editor', u'firstName': u'Ann',
+				u'lastName': u'Editor'}])
+		self.assertEqual(z.item_by_key(self.article_key)[u'publicationTitle'],
+			u'Textual strategies')
+		self.assertEqual(z.rawtext_by_key(self.book_key)[u'path'], u'/raw.pdf')
+		self.assertEqual(z.citfile_by_key(self.article_key)[u'path'],
+			self.citations)
+
+	def test_trash_is_excluded(self):
+		z = self.zotero()
+		self.assertIsNone(z.item_by_key(self.trashed_key))
+		self.assertNotIn(u'/trashed.txt', [a[u'path'] for a in z.attachments])
+		self.assertIsNone(z.rawtext_by_key(self.article_key))
+
+	def test_libraries_are_kept_apart(self):
+		self.assertIsNone(self.zotero().item_by_key(self.group_key))
+		z = self.zotero(library_id=555, library_type=u'group')
+		self.assertEqual([i[u'key'] for i in z.texts], [self.group_key])
+		self.assertEqual(z.version, 7)
+		with self.assertRaises(ValueError):
+			self.zotero(library_id=556, library_type=u'group')
+
+	def test_relative_paths_resolve_to_base_dir(self):
+		cleantext = self.zotero().cleantext_by_key(self.book_key)
+		self.assertEqual(cleantext[u'key'], self.cleantext_key)
+		self.assertEqual(cleantext[u'path'],
+			os.path.join(self.storage, u'clean.txt'))
+		cleantext = self.zotero(base_dir=None).cleantext_by_key(self.book_key)
+		self.assertEqual(cleantext[u'path'], u'attachments:clean.txt')
+
+	def test_is_read_only(self):
+		z = self.zotero()
+		with self.assertRaises(ValueError):
+			z.write_items([{u'itemType': u'note', u'note': u'n'}])
+		with self.assertRaises(ValueError):
+			z.upload_cleantexts()
+
+	def test_loads_intertext_offline(self):
+		intertext = Intertext(u'x')
+		intertext.load_Zotero(self.zotero(), upload_new=False)
+		self.assertEqual(len(intertext), 2)
+		by_title = dict((t.title, t) for t in intertext.texts)
+		book = by_title[u'The archaeology of knowledge']
+		article = by_title[u'What is an author']
+		self.assertEqual(book.cleantext_path,
+			os.path.join(self.storage, u'clean.txt'))
+		self.assertEqual([unicode(a) for a in book.authors],
+			[unicode(a) for a in article.authors])
+		self.assertEqual(list(article.cites), [article]) # matched itself
+
+
+if __name__ == u'__main__':
+	unittest.main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+'''
+Local stand-in for the subset of the Zotero web API used by Zotero (paged
+item listings with since=, versions, deleted items and batched writes with
+write tokens), with simulated latency and failures
+'''
+import json
+import socket
+import threading
+import time
+import urllib
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+
+class Library(object):
+	'''
+	Items of a stand-in Zotero library served by Handler
+	'''
+	def __init__(self):
+		self.version = 0
+		self.items = {} # key -> item data
+		self.deleted = {} # key -> library version of the deletion
+		self.tokens = set()
+		self.requests = []
+		self.fail_next = [] # statuses returned for the next POSTs (None: ok)
+		self.drop_next = 0 # POSTs written without answering
+		self.on_page = None # called on GETs of pages after the first
+		self.latency = 0.0 # seconds each GET takes
+		self.in_flight = 0 # GETs being answered
+		self.max_in_flight = 0
+		self.lock = threading.Lock()
+
+	def put(self, data):
+		with self.lock:
+			self.version += 1
+			key = data.get(u'key') or u'K{:07d}'.format(self.version)
+			self.items[key] = dict(data, key=key, version=self.version)
+			return key
+
+	def delete(self, key):
+		with self.lock:
+			self.version += 1
+			del self.items[key]
+			self.deleted[key] = self.version
+
+	def listing(self, collection, since=0):
+		'''
+		Returns the items of collection modified since, in the API's order 
+		(newest first)
+		'''
+		items = [i for i in self.items.values() if i['version'] > since
+			and (collection is None or collection in i.get('collections', []))]
+		return sorted(items, key=lambda i: (-i['version'], i['key']))
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def log_message(self, *args):
+		pass
+
+	def send_json(self, obj, status=200, headers=()):
+		body = json.dumps(obj)
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.send_header('Last-Modified-Version', str(self.server.lib.version))
+		for header in headers:
+			self.send_header(*header)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		lib = self.server.lib
+		with lib.lock:
+			lib.in_flight += 1
+			lib.max_in_flight = max(lib.max_in_flight, lib.in_flight)
+		try:
+			time.sleep(lib.latency)
+			self.get()
+		finally:
+			with lib.lock:
+				lib.in_flight -= 1
+
+	def get(self):
+		lib = self.server.lib
+		url = urlparse.urlparse(self.path)
+		query = dict(urlparse.parse_qsl(url.query))
+		parts = url.path.strip('/').split('/')
+		since = int(query.get('since', 0))
+		lib.requests.append(('GET', url.path, query))
+		if parts[-1] == 'deleted':
+			return self.send_json({'items': [k for k, v in lib.deleted.items()
+				if v > since]})
+		items = lib.listing(parts[3] if len(parts) == 5 else None, since)
+		if query.get('format') == 'versions':
+			return self.send_json(dict((i['key'], i['version']) for i in items))
+		start, limit = int(query.get('start', 0)), int(query.get('limit', 100))
+		if start and lib.on_page:
+			lib.on_page()
+		headers = [('Total-Results', str(len(items)))]
+		if start + limit < len(items): # followed by pyzotero's everything()
+			headers.append(('Link', '<http://{}:{}{}?{}>; rel="next"'.format(
+				self.server.server_address[0], self.server.server_address[1], 
+				url.path, urllib.urlencode(dict(query, start=start + limit)))))
+		self.send_json([{'key': i['key'], 'version': i['version'], 'data': i}
+			for i in items[start:start + limit]], headers=headers)
+
+	def do_POST(self):
+		lib = self.server.lib
+		body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+		lib.requests.append(('POST', self.path, len(body)))
+		status = lib.fail_next.pop(0) if lib.fail_next else None
+		if status:
+			return self.send_json({}, status=status, 
+				headers=[('Retry-After', '0')])
+		token = self.headers.get('Zotero-Write-Token')
+		if token in lib.tokens:
+			return self.send_json({}, status=412)
+		lib.tokens.add(token)
+		success = dict((str(n), lib.put(item)) for n, item in enumerate(body))
+		if lib.drop_next:
+			lib.drop_next -= 1
+			self.close_connection = 1
+			self.connection.shutdown(socket.SHUT_RDWR)
+			return
+		self.send_json({'success': success, 'unchanged': {}, 'failed': {}})
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+
+def start(lib):
+	'''
+	Serves lib on a free local port in a background thread. Returns the 
+	server and its url (the endpoint for Zotero).
+	'''
+	server = Server(('127.0.0.1', 0), Handler)
+	server.lib = lib
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def stop(server):
+	server.shutdown()
+	server.server_close()